@@ -0,0 +1,383 @@
+"""
+NRCS Hydrograph Generator Batch Processor
+
+Command-line batch mode for generating hydrographs for many watersheds
+without the Streamlit interface. Watersheds are read in chunks from a CSV
+or Parquet file, processed in parallel worker processes, and written to the
+output directory one part file per chunk so memory use stays bounded.
+
+Input columns:
+    basin_id         Watershed identifier (optional, defaults to row number)
+    area_mi2         Catchment area in square miles
+    avg_slope        Average catchment slope in %
+    cn / S           Curve number and/or potential maximum storage (mm)
+    method           "CN" or "S" (optional, defaults to CN when cn is given)
+    time_interval    Time interval in minutes (optional, see --time-interval)
+    m                Gamma shape factor (optional, see --m)
+    <aep>yr          Peak flow in CFS for each AEP, e.g. 10yr, 100yr
+
+Example:
+    python batch_run.py watersheds.csv results/ --workers 8 --chunk-size 5000
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from nrcs_calculator import OrdinateCache, calculate_time_parameters_batch, generate_hydrographs_batch
+from nrcs_exports import write_table
+from nrcs_sweep import TpLookupTable
+
+# Peak flow columns are named after the AEP, e.g. "100yr"
+AEP_COLUMN_PATTERN = re.compile(r"^(\d+)yr$")
+
+# Name of the progress log used to resume interrupted runs
+PROGRESS_FILE = "progress.jsonl"
+
+# Settings of the run, checked when resuming
+JOB_FILE = "job.json"
+
+# Per-process ordinate cache, reused across the chunks a worker handles
+_worker_cache = OrdinateCache()
+
+# Per-process lookup tables opened by path (memory-mapped, shared through the OS page cache)
+_worker_tables = {}
+
+
+def read_watershed_chunks(input_path, chunk_size):
+    """
+    Lazily read the watershed table in chunks
+
+    Args:
+        input_path: Path to a CSV or Parquet file
+        chunk_size: Number of watersheds per chunk
+
+    Yields:
+        (chunk_index, DataFrame) tuples
+    """
+    if input_path.lower().endswith((".parquet", ".pq")):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Reading Parquet files requires pyarrow. Try installing it with: pip install pyarrow")
+        batches = (batch.to_pandas() for batch in pq.ParquetFile(input_path).iter_batches(batch_size=chunk_size))
+    else:
+        batches = pd.read_csv(input_path, chunksize=chunk_size)
+
+    row_start = 0
+    for chunk_index, chunk in enumerate(batches):
+        # Default watershed identifiers are global row numbers
+        if "basin_id" not in chunk.columns:
+            chunk.insert(0, "basin_id", np.arange(row_start, row_start + len(chunk)))
+        row_start += len(chunk)
+        yield chunk_index, chunk
+
+
+def watershed_inputs(chunk, time_interval=5.0, m=3.7):
+    """
+    Per-watershed inputs of a chunk with blank cells filled in
+
+    Missing time_interval and m cells take the run defaults. A blank method
+    is CN where a curve number is given and S otherwise, and a row whose
+    method names a blank parameter uses the other one when it is given.
+
+    Args:
+        chunk: DataFrame of watersheds (see the module docstring for columns)
+        time_interval: Default time interval in minutes
+        m: Default gamma shape factor
+
+    Returns:
+        Dictionary of arrays 'cn', 'S', 'method', 'time_interval' and 'm'
+
+    Raises:
+        ValueError: If a watershed has neither a curve number nor S
+    """
+    n = len(chunk)
+    cn = chunk["cn"].to_numpy(dtype=float) if "cn" in chunk.columns else np.full(n, np.nan)
+    S = chunk["S"].to_numpy(dtype=float) if "S" in chunk.columns else np.full(n, np.nan)
+    has_cn, has_S = ~np.isnan(cn), ~np.isnan(S)
+
+    # Choose each row's method from the given parameters where it is blank or unusable
+    if "method" in chunk.columns:
+        method = chunk["method"].fillna("").astype(str).str.strip().str.upper().to_numpy(dtype=object)
+    else:
+        method = np.full(n, "", dtype=object)
+    blank = method == ""
+    method[blank] = np.where(has_cn[blank], "CN", "S")
+    method[(method == "CN") & ~has_cn & has_S] = "S"
+    method[(method == "S") & ~has_S & has_cn] = "CN"
+
+    missing = ~has_cn & ~has_S
+    if missing.any():
+        basin_ids = chunk["basin_id"].to_numpy()[missing][:5]
+        raise ValueError(f"{missing.sum()} watershed(s) have neither cn nor S, e.g. basin_id {list(basin_ids)}.")
+
+    intervals = chunk["time_interval"].fillna(time_interval) if "time_interval" in chunk.columns else None
+    m_values = chunk["m"].fillna(m) if "m" in chunk.columns else None
+    return {
+        "cn": cn,
+        "S": S,
+        "method": method.astype(str),
+        "time_interval": np.full(n, time_interval, dtype=float) if intervals is None else intervals.to_numpy(dtype=float),
+        "m": np.full(n, m, dtype=float) if m_values is None else m_values.to_numpy(dtype=float)
+    }
+
+
+def compute_chunk(chunk, time_interval=5.0, m=3.7, duration=5, lookup_table=None):
+    """
+    Generate time parameters and long-format hydrographs for a chunk of watersheds
+
+    Args:
+        chunk: DataFrame of watersheds (see the module docstring for columns)
+        time_interval: Default time interval in minutes
+        m: Default gamma shape factor
+        duration: Duration multiple of Tp
+        lookup_table: Optional path of a TpLookupTable (see nrcs_sweep) used
+            instead of the lag equation where it covers the watershed
+
+    Returns:
+        Tuple of (parameters DataFrame, hydrographs DataFrame)
+    """
+    # Per-watershed inputs, falling back to run-wide defaults
+    inputs = watershed_inputs(chunk, time_interval, m)
+    cn, S, method = inputs["cn"], inputs["S"], inputs["method"]
+    intervals, m_values = inputs["time_interval"], inputs["m"]
+
+    # Time parameters for every watershed in one pass
+    time_parameters_batch = calculate_time_parameters_batch
+    if lookup_table is not None:
+        if lookup_table not in _worker_tables:
+            _worker_tables[lookup_table] = TpLookupTable.load(lookup_table)
+        time_parameters_batch = _worker_tables[lookup_table].time_parameters_batch
+    params = time_parameters_batch(
+        chunk["area_mi2"].to_numpy(dtype=float),
+        chunk["avg_slope"].to_numpy(dtype=float),
+        intervals,
+        cn=cn,
+        S=S,
+        method=method
+    )
+    basin_ids = chunk["basin_id"].to_numpy()
+    params_df = pd.DataFrame({
+        "basin_id": basin_ids,
+        "t_lag_hr": params["t_lag"],
+        "tc_hr": params["tc"],
+        "tr_hr": params["tr"],
+        "Tp_hr": params["Tp"],
+        "valid": params["valid"]
+    })
+
+    # Long-format hydrographs, one block per AEP column
+    frames = []
+    for column in chunk.columns:
+        match = AEP_COLUMN_PATTERN.match(str(column))
+        if not match:
+            continue
+        peaks = chunk[column].to_numpy(dtype=float)
+        has_peak = ~np.isnan(peaks)
+        if not has_peak.any():
+            continue
+
+        subset = {key: value[has_peak] for key, value in params.items()}
+        result = generate_hydrographs_batch(subset, peaks[has_peak], m=m_values[has_peak], duration=duration,
+                                            layout="ragged", cache=_worker_cache)
+        frames.append(pd.DataFrame({
+            "basin_id": np.repeat(basin_ids[has_peak], result["lengths"]),
+            "aep": int(match.group(1)),
+            "time_hr": result["time_hours"],
+            "flow_cfs": result["flow_cfs"],
+            "flow_m3s": result["flow_m3s"]
+        }))
+    hydrographs_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+        columns=["basin_id", "aep", "time_hr", "flow_cfs", "flow_m3s"])
+
+    return params_df, hydrographs_df
+
+
+def process_chunk(chunk_index, chunk, output_dir, output_format, time_interval, m, duration, lookup_table=None):
+    """
+    Generate hydrographs for one chunk of watersheds and write them to disk
+
+    Runs in a worker process. Results are written to temporary files and
+    renamed once complete, so a part file on disk is always a finished chunk.
+
+    Args:
+        chunk_index: Sequential chunk number (used in output file names)
+        chunk: DataFrame of watersheds
+        output_dir: Directory for output part files
+        output_format: "csv", "parquet" or "arrow"
+        time_interval: Default time interval in minutes
+        m: Default gamma shape factor
+        duration: Duration multiple of Tp
+        lookup_table: Optional path of a TpLookupTable
+
+    Returns:
+        Dictionary with the chunk index and row counts
+    """
+    params_df, hydrographs_df = compute_chunk(chunk, time_interval, m, duration, lookup_table)
+
+    # Write to temporary files, then rename so partial output is never mistaken for a finished chunk
+    for name, df in (("parameters", params_df), ("hydrographs", hydrographs_df)):
+        final_path = os.path.join(output_dir, f"{name}-{chunk_index:06d}.{output_format}")
+        temp_path = final_path + ".tmp"
+        write_table([df], temp_path, output_format)
+        os.replace(temp_path, final_path)
+
+    return {"chunk": chunk_index, "basins": len(chunk), "rows": len(hydrographs_df)}
+
+
+def load_completed_chunks(output_dir):
+    """Return the set of chunk indices recorded as finished in the progress log"""
+    progress_path = os.path.join(output_dir, PROGRESS_FILE)
+    completed = set()
+    if os.path.exists(progress_path):
+        with open(progress_path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    completed.add(json.loads(line)["chunk"])
+    return completed
+
+
+def run_batch(input_path, output_dir, chunk_size=5000, workers=None, output_format="csv",
+              time_interval=5.0, m=3.7, duration=5, resume=False, lookup_table=None):
+    """
+    Process a watershed table chunk by chunk across a process pool
+
+    At most two chunks per worker are held in memory at once. Each finished
+    chunk is appended to the progress log so an interrupted run can be
+    resumed with resume=True.
+
+    Args:
+        input_path: Path to a CSV or Parquet watershed table
+        output_dir: Directory for output part files and the progress log
+        chunk_size: Number of watersheds per chunk
+        workers: Number of worker processes (default: CPU count)
+        output_format: "csv", "parquet" or "arrow"
+        time_interval: Default time interval in minutes
+        m: Default gamma shape factor
+        duration: Duration multiple of Tp
+        resume: Skip chunks already recorded in the progress log (the settings
+            must match the run being resumed, see job.json)
+        lookup_table: Optional path of a TpLookupTable to read time parameters from
+
+    Returns:
+        Dictionary with total chunks, basins and hydrograph rows written
+    """
+    job = {
+        "input": os.path.abspath(input_path),
+        "chunk_size": chunk_size,
+        "output_format": output_format,
+        "time_interval": time_interval,
+        "m": m,
+        "duration": duration,
+        "lookup_table": lookup_table
+    }
+
+    # Chunk indices and results only line up with a run that used the same settings
+    os.makedirs(output_dir, exist_ok=True)
+    job_path = os.path.join(output_dir, JOB_FILE)
+    if resume and os.path.exists(job_path):
+        with open(job_path) as f:
+            previous = json.load(f)
+        changed = sorted(key for key in job if previous.get(key) != job[key])
+        if changed:
+            raise ValueError(f"Settings differ from the run being resumed ({', '.join(changed)}); "
+                             f"see {job_path}.")
+        completed = load_completed_chunks(output_dir)
+    else:
+        completed = set()
+        if os.path.exists(os.path.join(output_dir, PROGRESS_FILE)):
+            os.remove(os.path.join(output_dir, PROGRESS_FILE))
+    with open(job_path, "w") as f:
+        json.dump(job, f, indent=2)
+
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = 2 * workers
+    totals = {"chunks": 0, "basins": 0, "rows": 0, "skipped": 0}
+    start_time = time.time()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor, \
+            open(os.path.join(output_dir, PROGRESS_FILE), "a") as progress_log:
+        pending = set()
+
+        def collect(done):
+            # Record finished chunks and report progress
+            for future in done:
+                stats = future.result()
+                progress_log.write(json.dumps(stats) + "\n")
+                progress_log.flush()
+                totals["chunks"] += 1
+                totals["basins"] += stats["basins"]
+                totals["rows"] += stats["rows"]
+                elapsed = time.time() - start_time
+                print(f"Chunk {stats['chunk']} done: {totals['basins']} basins, {totals['rows']} rows "
+                      f"({totals['basins'] / max(elapsed, 1e-9):.0f} basins/s)")
+
+        for chunk_index, chunk in read_watershed_chunks(input_path, chunk_size):
+            if chunk_index in completed:
+                totals["skipped"] += 1
+                continue
+
+            # Keep memory bounded by waiting for a slot before submitting more
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(executor.submit(process_chunk, chunk_index, chunk, output_dir, output_format,
+                                        time_interval, m, duration, lookup_table))
+
+        done, _ = wait(pending)
+        collect(done)
+
+    return totals
+
+
+def main(argv=None):
+    """Parse command-line arguments and run the batch processor"""
+    parser = argparse.ArgumentParser(description="Generate NRCS dimensionless unit hydrographs for many watersheds.")
+    parser.add_argument("input", help="CSV or Parquet file of watersheds and per-AEP peak flows")
+    parser.add_argument("output_dir", help="Directory for output part files")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Watersheds per chunk (default: 5000)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--format", choices=["csv", "parquet", "arrow"], default="csv", help="Output format (default: csv)")
+    parser.add_argument("--time-interval", type=float, default=5.0,
+                        help="Time interval in minutes when the input has no time_interval column (default: 5)")
+    parser.add_argument("--m", type=float, default=3.7,
+                        help="Gamma shape factor when the input has no m column (default: 3.7)")
+    parser.add_argument("--duration", type=float, default=5, help="Duration multiple of Tp (default: 5)")
+    parser.add_argument("--resume", action="store_true", help="Skip chunks already completed by a previous run")
+    parser.add_argument("--lookup-table", default=None,
+                        help="Read time parameters from a saved TpLookupTable (path without extension)")
+    args = parser.parse_args(argv)
+
+    print("=" * 60)
+    print("NRCS Dimensionless Unit Hydrograph Batch Processor")
+    print("=" * 60)
+
+    totals = run_batch(
+        args.input,
+        args.output_dir,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        output_format=args.format,
+        time_interval=args.time_interval,
+        m=args.m,
+        duration=args.duration,
+        resume=args.resume,
+        lookup_table=args.lookup_table
+    )
+
+    print(f"\nFinished: {totals['chunks']} chunks, {totals['basins']} basins, {totals['rows']} hydrograph rows "
+          f"({totals['skipped']} chunks skipped from a previous run).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
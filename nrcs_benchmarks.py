@@ -0,0 +1,261 @@
+"""
+NRCS Hydrograph Generator Benchmarks
+
+Reproducible timing benchmarks for the calculator, the batch paths and the
+app's data pipeline. Each scenario is timed with timeit (auto-ranged number
+of loops, several repeats) and results are written as JSON. A saved result
+file can be used as a baseline: scenarios whose median time grows by more
+than the regression threshold are reported and the run exits with status 1.
+
+Examples:
+    python nrcs_benchmarks.py --output bench.json
+    python nrcs_benchmarks.py --baseline bench.json --threshold 0.2
+    python nrcs_benchmarks.py --filter batch
+"""
+
+import argparse
+import io
+import json
+import platform
+import sys
+import timeit
+from datetime import datetime
+
+import numpy as np
+
+from nrcs_calculator import (
+    ORDINATE_CACHE,
+    NRCSHydrographGenerator,
+    OrdinateCache,
+    calculate_time_parameters_batch,
+    generate_hydrographs_batch,
+    time_parameters
+)
+from nrcs_exports import iter_result_chunks, write_csv_chunks
+
+# AEPs used by the app
+AEP_VALUES = [1, 2, 5, 10, 25, 50, 100, 200, 500, 1000]
+
+
+def make_generator(area_mi2=2.0, time_interval=5.0):
+    """Return a generator with time parameters calculated"""
+    generator = NRCSHydrographGenerator()
+    generator.area_mi2 = area_mi2
+    generator.time_interval = time_interval
+    generator.calculate_time_parameters()
+    return generator
+
+
+def uncached(statement):
+    """
+    Clear the calculator's memoization before each timed call
+
+    time_parameters and the shared ordinate cache otherwise turn repeated
+    calls into dictionary lookups, hiding the cost of the equations.
+    """
+    def call(*args):
+        time_parameters.__wrapped__.cache_clear()
+        ORDINATE_CACHE.clear()
+        return statement(*args)
+    return call
+
+
+def synthetic_basins(n_basins, seed=0):
+    """Random but reproducible watershed inputs"""
+    rng = np.random.default_rng(seed)
+    return {
+        'area_mi2': rng.uniform(0.1, 50.0, n_basins),
+        'avg_slope': rng.uniform(0.5, 10.0, n_basins),
+        'cn': rng.uniform(55.0, 95.0, n_basins),
+        'peak_flow_cfs': rng.uniform(100.0, 20000.0, n_basins)
+    }
+
+
+def batch_inputs(n_basins, shared_shapes=False):
+    """
+    Time parameters and peak flows for a synthetic basin set
+
+    With shared_shapes, areas and CNs are rounded and the slope is fixed so
+    many basins share a hydrograph shape (the case the ordinate cache targets).
+    """
+    basins = synthetic_basins(n_basins)
+    if shared_shapes:
+        params = calculate_time_parameters_batch(
+            np.maximum(np.round(basins['area_mi2']), 1.0), 2.0, 5.0, cn=np.round(basins['cn'], -1))
+    else:
+        params = calculate_time_parameters_batch(basins['area_mi2'], basins['avg_slope'], 5.0, cn=basins['cn'])
+    return params, basins['peak_flow_cfs']
+
+
+def build_scenarios():
+    """
+    Return the benchmark scenarios as a dictionary of name -> (setup, statement)
+
+    setup() runs once before timing and returns the arguments passed to
+    statement(*args), which is the timed call.
+    """
+    scenarios = {}
+
+    # Single time lag calculation, evaluated and memoized
+    scenarios['calculate_tlag'] = (lambda: (make_generator(),), uncached(lambda g: g.calculate_tlag()))
+    scenarios['calculate_tlag[cached]'] = (lambda: (make_generator(),), lambda g: g.calculate_tlag())
+
+    # Single hydrograph across time intervals and basin sizes (Tp grows with area),
+    # with Q/Qp evaluated each call and taken from the ordinate cache
+    for time_interval in (1, 5, 15):
+        for area in (2.0, 50.0, 500.0):
+            name = f"generate_hydrograph[dt={time_interval}min,area={area:g}mi2"
+            scenarios[name + "]"] = (
+                lambda ti=time_interval, a=area: (make_generator(a, ti),),
+                uncached(lambda g: g.generate_hydrograph(1000.0))
+            )
+            scenarios[name + ",cached]"] = (
+                lambda ti=time_interval, a=area: (make_generator(a, ti),),
+                lambda g: g.generate_hydrograph(1000.0)
+            )
+
+    # All 10 AEPs, one call each versus one shared ordinate evaluation
+    peaks = [100.0 * aep ** 0.5 for aep in AEP_VALUES]
+    scenarios['all_aeps[per_aep_loop]'] = (
+        lambda: (make_generator(50.0, 1),),
+        lambda g: [g.generate_hydrograph(p) for p in peaks]
+    )
+    scenarios['all_aeps[generate_hydrographs]'] = (
+        lambda: (make_generator(50.0, 1),),
+        lambda g: g.generate_hydrographs(peaks)
+    )
+
+    # App data pipeline: table assembly and CSV export
+    scenarios['dataframe_assembly[10_aeps]'] = (
+        lambda: (make_generator(50.0, 1).generate_result(peaks, AEP_VALUES),),
+        lambda result: result.to_dataframe()
+    )
+    scenarios['csv_export[10_aeps]'] = (
+        lambda: (make_generator(50.0, 1).generate_result(peaks, AEP_VALUES),),
+        lambda result: write_csv_chunks(iter_result_chunks(result), io.StringIO())
+    )
+
+    # Large synthetic basin sets through the batch engine
+    for n_basins in (1000, 10000):
+        scenarios[f"batch_time_parameters[{n_basins}_basins]"] = (
+            lambda n=n_basins: (synthetic_basins(n),),
+            lambda b: calculate_time_parameters_batch(b['area_mi2'], b['avg_slope'], 5.0, cn=b['cn'])
+        )
+        scenarios[f"batch_hydrographs[{n_basins}_basins,ragged]"] = (
+            lambda n=n_basins: batch_inputs(n),
+            lambda params, peaks: generate_hydrographs_batch(params, peaks, layout="ragged")
+        )
+        scenarios[f"batch_hydrographs[{n_basins}_basins,ragged,cached]"] = (
+            lambda n=n_basins: batch_inputs(n, shared_shapes=True) + (OrdinateCache(),),
+            lambda params, peaks, cache: generate_hydrographs_batch(params, peaks, layout="ragged", cache=cache)
+        )
+
+    return scenarios
+
+
+def run_benchmarks(name_filter=None, repeat=5, min_time=0.2):
+    """
+    Time every scenario whose name contains name_filter
+
+    Args:
+        name_filter: Optional substring selecting scenarios
+        repeat: Number of timing repeats per scenario
+        min_time: Minimum duration of one repeat in seconds (sets loops per repeat)
+
+    Returns:
+        Dictionary with run metadata and per-scenario timings (seconds per call)
+    """
+    results = {}
+    for name, (setup, statement) in build_scenarios().items():
+        if name_filter and name_filter not in name:
+            continue
+        args = setup()
+        timer = timeit.Timer(lambda: statement(*args))
+
+        # Pick a loop count so one repeat takes at least min_time
+        number = 1
+        while timer.timeit(number) < min_time and number < 1_000_000:
+            number *= 10
+        times = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+
+        results[name] = {
+            'min': min(times),
+            'median': float(np.median(times)),
+            'repeat': repeat,
+            'number': number
+        }
+        print(f"{name:<60s} {results[name]['median'] * 1e3:12.4f} ms")
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor()
+        },
+        'results': results
+    }
+
+
+def compare_to_baseline(current, baseline, threshold=0.2):
+    """
+    Compare median timings with a baseline run
+
+    Args:
+        current: Result dictionary from run_benchmarks
+        baseline: Result dictionary loaded from a previous run
+        threshold: Allowed relative slowdown (0.2 = 20%)
+
+    Returns:
+        List of (name, baseline median, current median, ratio) for regressions
+    """
+    regressions = []
+    print(f"\n{'Scenario':<60s} {'Baseline':>12s} {'Current':>12s} {'Ratio':>8s}")
+    for name, timing in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        before = baseline['results'][name]['median']
+        after = timing['median']
+        ratio = after / before if before > 0 else float('inf')
+        flag = "  REGRESSION" if ratio > 1 + threshold else ""
+        print(f"{name:<60s} {before * 1e3:10.4f}ms {after * 1e3:10.4f}ms {ratio:8.2f}{flag}")
+        if flag:
+            regressions.append((name, before, after, ratio))
+    return regressions
+
+
+def main(argv=None):
+    """Parse command-line arguments, run the benchmarks and compare to a baseline"""
+    parser = argparse.ArgumentParser(description="Benchmark the NRCS hydrograph generator.")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed relative slowdown before a scenario counts as a regression (default: 0.2)")
+    parser.add_argument("--filter", help="Only run scenarios whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repeats per scenario (default: 5)")
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="Minimum seconds per repeat (default: 0.2)")
+    args = parser.parse_args(argv)
+
+    current = run_benchmarks(args.filter, args.repeat, args.min_time)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(current, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} scenario(s) slower than the baseline by more than {args.threshold:.0%}.")
+            return 1
+        print("\nNo regressions against the baseline.")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
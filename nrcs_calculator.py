@@ -1,24 +1,1059 @@
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+
 import numpy as np
 
+from nrcs_instrumentation import record_array, timed
+
+# Unit conversion factors
+SQMI_TO_KM2 = 2.58999  # square miles to square kilometers
+CFS_TO_M3S = 0.0283168  # cubic feet per second to cubic meters per second
+CFS_HR_PER_INCH_MI2 = 645.333  # runoff volume of 1 inch over 1 square mile, in CFS·hours
+
+# SCS Type II 24-hour rainfall distribution (hours, cumulative fraction of total depth)
+TYPE_II_24HR = (
+    (0.0, 2.0, 4.0, 6.0, 7.0, 8.0, 8.5, 9.0, 9.5, 9.75, 10.0, 10.5, 11.0, 11.5, 11.75,
+     12.0, 12.5, 13.0, 13.5, 14.0, 16.0, 20.0, 24.0),
+    (0.0, 0.022, 0.048, 0.080, 0.098, 0.120, 0.133, 0.147, 0.163, 0.172, 0.181, 0.204, 0.235, 0.283, 0.357,
+     0.663, 0.735, 0.772, 0.799, 0.820, 0.880, 0.952, 1.0)
+)
+
+# Shorter input switches convolution from direct summation to FFT
+FFT_CONVOLUTION_THRESHOLD = 64
+
+
+def _compute_tlag(area_mi2, avg_slope, cn=None, S=None, method="CN"):
+    """
+    Evaluate the time lag equation for scalars or NumPy arrays
+    
+    Args:
+        area_mi2: Catchment area in square miles
+        avg_slope: Average catchment slope in %
+        cn: Curve number (used by the CN method)
+        S: Potential maximum storage in mm (used by the S method)
+        method: "CN", "S", or an array of per-watershed methods
+        
+    Returns:
+        Time lag in hours (same shape as the broadcast inputs)
+    """
+    # Convert area from square miles to km²
+    area_km2 = np.asarray(area_mi2, dtype=float) * SQMI_TO_KM2
+    
+    # Compute hydraulic length L (meters)
+    L = 1740 * (area_km2 ** 0.6)
+    
+    # Storage term of the lag equation depends on the method
+    if isinstance(method, str):
+        if method == "CN":
+            storage_term = 1000 / np.asarray(cn, dtype=float) - 9
+        elif method == "S":
+            storage_term = np.asarray(S, dtype=float) / 25.4 + 1
+        else:
+            raise ValueError("Invalid method for time lag calculation. Use 'CN' or 'S'.")
+    else:
+        # Per-watershed methods: evaluate both branches and pick per element
+        method = np.asarray(method)
+        if not np.isin(method, ["CN", "S"]).all():
+            raise ValueError("Invalid method for time lag calculation. Use 'CN' or 'S'.")
+        cn_arr = np.asarray(cn if cn is not None else np.nan, dtype=float)
+        s_arr = np.asarray(S if S is not None else np.nan, dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            storage_term = np.where(method == "CN", 1000 / cn_arr - 9, s_arr / 25.4 + 1)
+    
+    return 1.362e-3 * (storage_term ** 0.7) * (L ** 0.8) / np.sqrt(avg_slope)
+
+
+@timed("calculate_time_parameters_batch")
+def calculate_time_parameters_batch(area_mi2, avg_slope, time_interval=5.0, cn=None, S=None, method="CN"):
+    """
+    Calculate time parameters for many watersheds in one vectorized pass
+    
+    Args:
+        area_mi2: Array of catchment areas in square miles
+        avg_slope: Array of average catchment slopes in %
+        time_interval: Array (or scalar) of hydrograph time intervals in minutes
+        cn: Array of curve numbers (required for the CN method)
+        S: Array of potential maximum storage in mm (required for the S method)
+        method: "CN", "S", or an array of per-watershed methods
+        
+    Returns:
+        Dictionary of NumPy arrays with keys 't_lag', 'tc', 'tr', 'Tp',
+        'dt' (hours) and 'valid' (NRCS DUH validity flag per watershed)
+    """
+    t_lag = np.atleast_1d(_compute_tlag(area_mi2, avg_slope, cn=cn, S=S, method=method))
+    return time_parameters_from_tlag(t_lag, time_interval)
+
+
+def time_parameters_from_tlag(t_lag, time_interval=5.0):
+    """
+    Derive the remaining time parameters from time lag arrays
+    
+    Args:
+        t_lag: Array of time lags in hours (any shape)
+        time_interval: Array (or scalar) of hydrograph time intervals in minutes
+        
+    Returns:
+        Dictionary as returned by calculate_time_parameters_batch
+    """
+    t_lag = np.asarray(t_lag, dtype=float)
+    
+    # Same relationships as time_parameters
+    tc = t_lag / 0.6
+    tr = 0.133 * tc
+    Tp = 0.5 * tr + t_lag
+    dt = np.broadcast_to(np.asarray(time_interval, dtype=float) / 60.0, t_lag.shape).copy()
+    
+    # Verify NRCS dimensionless unit hydrograph validity per watershed
+    valid = ~((tr > 0.2 * tc) | (tr > 0.3 * Tp))
+    
+    return {'t_lag': t_lag, 'tc': tc, 'tr': tr, 'Tp': Tp, 'dt': dt, 'valid': valid}
+
+
+def _duh_ordinates(m, step_ratio, duration):
+    """
+    Evaluate Q/Qp at t/Tp = 0, step_ratio, 2*step_ratio, ... below duration
+    
+    Args:
+        m: Gamma shape factor
+        step_ratio: Time step as a fraction of Tp (dt/Tp)
+        duration: Duration multiple of Tp
+        
+    Returns:
+        Q/Qp array (dimensionless)
+    """
+    # Q/Qp = ((t/Tp)^m) * exp(m * (1 - t/Tp))
+    t_ratio = np.arange(0, duration, step_ratio)
+    flow_ratio = np.power(t_ratio, m) * np.exp(m * (1 - t_ratio))
+    
+    # Set values to zero for t/Tp > 5 (end of hydrograph)
+    flow_ratio[t_ratio > 5] = 0
+    
+    return flow_ratio
+
+
+class OrdinateCache:
+    """
+    Bounded LRU cache of dimensionless unit hydrograph ordinates.
+    
+    The Q/Qp curve only depends on m, dt/Tp and the duration multiple, so
+    watersheds sharing those values (after rounding to `decimals` places)
+    share one read-only ordinate array. Entries are evicted least recently
+    used first once the cached arrays exceed `max_bytes`.
+    """
+    
+    def __init__(self, max_bytes=64 * 1024 * 1024, decimals=10):
+        """Initialize an empty cache with a byte budget and key rounding"""
+        self.max_bytes = max_bytes
+        self.decimals = decimals
+        
+        # Cached arrays in least-to-most recently used order
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def make_key(self, m, step_ratio, duration):
+        """Build the rounded cache key for a hydrograph shape"""
+        return (float(np.round(m, self.decimals)), float(np.round(step_ratio, self.decimals)), float(duration))
+    
+    def get(self, m, step_ratio, duration=5):
+        """
+        Return the Q/Qp ordinates for a shape, computing them on a miss
+        
+        Args:
+            m: Gamma shape factor
+            step_ratio: Time step as a fraction of Tp (dt/Tp)
+            duration: Duration multiple of Tp (default=5)
+            
+        Returns:
+            Read-only Q/Qp array (dimensionless)
+        """
+        key = self.make_key(m, step_ratio, duration)
+        
+        with self._lock:
+            ordinates = self._entries.get(key)
+            if ordinates is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return ordinates
+            self.misses += 1
+        
+        # Compute outside the lock so other threads are not blocked
+        ordinates = _duh_ordinates(*key)
+        ordinates.flags.writeable = False
+        record_array("ordinate_cache.miss", ordinates)
+        
+        with self._lock:
+            # Arrays larger than the whole budget are returned but not stored
+            if key not in self._entries and ordinates.nbytes <= self.max_bytes:
+                self._entries[key] = ordinates
+                self.current_bytes += ordinates.nbytes
+                
+                # Evict least recently used entries until back under budget
+                while self.current_bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.current_bytes -= evicted.nbytes
+                    self.evictions += 1
+        
+        return ordinates
+    
+    def get_many(self, m, step_ratio, duration=5):
+        """
+        Look up ordinates for arrays of shapes, fetching each distinct shape once
+        
+        Args:
+            m: Array of gamma shape factors
+            step_ratio: Array of time steps as fractions of Tp (dt/Tp)
+            duration: Duration multiple of Tp (default=5)
+            
+        Returns:
+            shape_index: Index into shape_ordinates for every element
+            shape_ordinates: List of read-only Q/Qp arrays, one per distinct shape
+        """
+        keys = np.column_stack((np.round(m, self.decimals), np.round(step_ratio, self.decimals)))
+        unique_keys, shape_index = np.unique(keys, axis=0, return_inverse=True)
+        shape_ordinates = [self.get(key_m, key_ratio, duration) for key_m, key_ratio in unique_keys]
+        return shape_index.reshape(-1), shape_ordinates
+    
+    def clear(self):
+        """Drop all cached entries (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+    
+    def stats(self):
+        """Return cache counters and memory use as a dictionary"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+# Shared cache used by NRCSHydrographGenerator
+ORDINATE_CACHE = OrdinateCache()
+
+
+@timed("generate_hydrographs_batch")
+def generate_hydrographs_batch(time_params, peak_flow_cfs, m=3.7, duration=5, layout="padded", cache=None):
+    """
+    Generate hydrographs for many watersheds in one vectorized pass
+    
+    Args:
+        time_params: Dictionary returned by calculate_time_parameters_batch
+        peak_flow_cfs: Array (or scalar) of peak flows in CFS, one per watershed
+        m: Array (or scalar) of gamma shape factors
+        duration: Duration multiple of Tp (default=5)
+        layout: "padded" for 2-D (watershed × time) arrays padded past each
+            hydrograph's end, or "ragged" for flat values plus offsets
+        cache: Optional OrdinateCache; watersheds sharing a shape then reuse
+            one ordinate array instead of evaluating Q/Qp per watershed
+            
+    Returns:
+        Dictionary of NumPy arrays. Both layouts contain 'lengths' (number of
+        time steps per watershed). The padded layout contains 2-D 'time_hours'
+        (NaN padding), 'flow_cfs' and 'flow_m3s' (zero padding). The ragged
+        layout contains 'offsets' (watershed i spans offsets[i]:offsets[i+1])
+        and flat 'time_hours', 'flow_cfs' and 'flow_m3s'.
+    """
+    Tp = np.asarray(time_params['Tp'], dtype=float)
+    dt = np.asarray(time_params['dt'], dtype=float)
+    n_basins = Tp.shape[0]
+    peak = np.broadcast_to(np.asarray(peak_flow_cfs, dtype=float), (n_basins,))
+    m = np.broadcast_to(np.asarray(m, dtype=float), (n_basins,))
+    
+    # Number of samples per watershed, matching np.arange(0, duration * Tp, dt)
+    if cache is None:
+        lengths = np.ceil(duration * Tp / dt).astype(np.int64)
+    else:
+        shape_index, shape_ordinates = cache.get_many(m, dt / Tp, duration)
+        shape_lengths = np.array([len(ordinates) for ordinates in shape_ordinates], dtype=np.int64)
+        lengths = shape_lengths[shape_index]
+    
+    if layout == "padded":
+        steps = np.arange(lengths.max() if n_basins else 0)
+        in_range = steps[None, :] < lengths[:, None]
+        time_hours = steps[None, :] * dt[:, None]
+    elif layout == "ragged":
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        in_range = None
+        if cache is None:
+            basin = np.repeat(np.arange(n_basins), lengths)
+            steps = np.arange(offsets[-1]) - offsets[basin]
+            time_hours = steps * dt[basin]
+        else:
+            # Filled per shape below
+            time_hours = np.empty(offsets[-1])
+    else:
+        raise ValueError("Invalid layout. Use 'padded' or 'ragged'.")
+    
+    if cache is None:
+        # Q/Qp = ((t/Tp)^m) * exp(m * (1 - t/Tp)), zero past t/Tp > 5
+        if layout == "padded":
+            t_ratio = time_hours / Tp[:, None]
+            m_b, peak_b = m[:, None], peak[:, None]
+        else:
+            t_ratio = time_hours / Tp[basin]
+            m_b, peak_b = m[basin], peak[basin]
+        flow_ratio = np.power(t_ratio, m_b) * np.exp(m_b * (1 - t_ratio))
+        flow_ratio[t_ratio > 5] = 0
+        
+        # Scale by peak flow
+        flow_cfs = flow_ratio * peak_b
+    else:
+        # Group watersheds by shape once (rows of shape k are order[bounds[k]:bounds[k + 1]])
+        order = np.argsort(shape_index, kind="stable")
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(shape_index, minlength=len(shape_ordinates)))))
+        
+        # Scatter each cached shape, scaled by peak flow, into its watersheds
+        flow_cfs = np.zeros(time_hours.shape)
+        for shape, ordinates in enumerate(shape_ordinates):
+            rows = order[bounds[shape]:bounds[shape + 1]]
+            scaled = peak[rows, None] * ordinates
+            if layout == "padded":
+                flow_cfs[rows, :len(ordinates)] = scaled
+            else:
+                steps = np.arange(len(ordinates))
+                index = offsets[rows, None] + steps
+                flow_cfs[index] = scaled
+                time_hours[index] = dt[rows, None] * steps
+    
+    # Padding beyond each hydrograph is zero flow, NaN time
+    if in_range is not None:
+        flow_cfs[~in_range] = 0
+        time_hours[~in_range] = np.nan
+    flow_m3s = flow_cfs * CFS_TO_M3S
+    
+    record_array("generate_hydrographs_batch.flow", flow_cfs)
+    record_array("generate_hydrographs_batch.flow", flow_m3s)
+    
+    result = {'lengths': lengths, 'time_hours': time_hours, 'flow_cfs': flow_cfs, 'flow_m3s': flow_m3s}
+    if layout == "ragged":
+        result['offsets'] = offsets
+    return result
+
+
+def _lgamma(z):
+    """Vectorized log-gamma function for positive arrays"""
+    return np.vectorize(math.lgamma, otypes=[float])(z)
+
+
+def _regularized_lower_gamma(a, x, max_terms=500):
+    """
+    Regularized lower incomplete gamma function P(a, x) for arrays
+    
+    Uses the power series for x < a + 1 and the continued fraction for the
+    complement Q(a, x) = 1 - P(a, x) otherwise, where each converges quickly.
+    
+    Args:
+        a: Array of shape parameters (> 0)
+        x: Array of upper integration limits (>= 0)
+        max_terms: Maximum number of series terms or fraction iterations
+        
+    Returns:
+        Array of P(a, x) values in [0, 1]
+    """
+    a, x = np.broadcast_arrays(np.asarray(a, dtype=float), np.asarray(x, dtype=float))
+    with np.errstate(divide='ignore'):
+        log_prefactor = a * np.log(x) - x - _lgamma(a)
+    result = np.empty(a.shape)
+    
+    # Power series: P(a, x) = x^a e^-x / Γ(a+1) * Σ x^n / ((a+1)...(a+n))
+    series = x < a + 1
+    if series.any():
+        a_s, x_s = a[series], x[series]
+        term = np.ones(a_s.shape)
+        total = np.ones(a_s.shape)
+        for n in range(1, max_terms):
+            term = term * x_s / (a_s + n)
+            total = total + term
+            if np.all(term <= 1e-16 * total):
+                break
+        result[series] = np.exp(log_prefactor[series] - np.log(a_s)) * total
+    
+    # Continued fraction for Q(a, x) (modified Lentz method)
+    fraction = ~series
+    if fraction.any():
+        a_f, x_f = a[fraction], x[fraction]
+        tiny = 1e-300
+        b = x_f + 1 - a_f
+        c = np.full(a_f.shape, 1 / tiny)
+        d = 1 / b
+        h = d.copy()
+        for i in range(1, max_terms):
+            an = -i * (i - a_f)
+            b = b + 2
+            d = an * d + b
+            d = np.where(np.abs(d) < tiny, tiny, d)
+            c = b + an / c
+            c = np.where(np.abs(c) < tiny, tiny, c)
+            d = 1 / d
+            delta = d * c
+            h = h * delta
+            if np.all(np.abs(delta - 1) <= 1e-15):
+                break
+        result[fraction] = 1 - np.exp(log_prefactor[fraction]) * h
+    
+    return np.clip(result, 0, 1)
+
+
+@timed("summarize_hydrographs")
+def summarize_hydrographs(Tp, peak_flow_cfs, m=3.7, threshold_cfs=None, duration=5):
+    """
+    Compute hydrograph summary metrics analytically, without building time series
+    
+    Metrics refer to the continuous gamma-shaped hydrograph truncated at
+    t/Tp = min(duration, 5), as generated by generate_hydrograph. All inputs
+    broadcast against each other, so one call covers any number of scenarios.
+    
+    Args:
+        Tp: Time to peak in hours
+        peak_flow_cfs: Peak flow in CFS
+        m: Gamma shape factor (default=3.7)
+        threshold_cfs: Flow threshold(s) in CFS for the time-above-threshold metric
+        duration: Duration multiple of Tp (default=5)
+        
+    Returns:
+        Dictionary of NumPy arrays: 'peak_flow_cfs', 'time_to_peak_hr',
+        'volume_ft3', 'volume_m3', 'truncation_error' (fraction of the
+        untruncated volume lost by the cutoff) and, when a threshold is given,
+        'hours_above_threshold'
+    """
+    inputs = [Tp, peak_flow_cfs, m] + ([] if threshold_cfs is None else [threshold_cfs])
+    inputs = np.broadcast_arrays(*[np.atleast_1d(np.asarray(value, dtype=float)) for value in inputs])
+    Tp, peak, m = inputs[:3]
+    cutoff = min(duration, 5)
+    
+    # Volume = Qp * Tp * e^m * ∫0^cutoff x^m e^(-m x) dx = Qp * Tp * e^m * Γ(m+1) / m^(m+1) * P(m+1, m*cutoff)
+    full_integral = np.exp(m + _lgamma(m + 1) - (m + 1) * np.log(m))
+    captured = _regularized_lower_gamma(m + 1, m * cutoff)
+    volume_ft3 = peak * Tp * 3600 * full_integral * captured
+    
+    summary = {
+        'peak_flow_cfs': peak.copy(),
+        'time_to_peak_hr': Tp.copy(),
+        'volume_ft3': volume_ft3,
+        'volume_m3': volume_ft3 * CFS_TO_M3S,
+        'truncation_error': 1 - captured
+    }
+    
+    if threshold_cfs is not None:
+        # Q/Qp = r where ln(x) + 1 - x = ln(r) / m, one root on each limb of the peak
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = inputs[3] / peak
+            target = np.log(np.clip(ratio, 1e-300, 1)) / m
+        
+        def newton(x):
+            # g(x) = ln(x) + 1 - x - target is concave, so Newton steps from the
+            # outer side of each root approach it monotonically; only elements
+            # that have not converged yet are updated
+            x = x.reshape(-1).copy()
+            flat_target = target.reshape(-1)
+            active = np.flatnonzero((ratio > 0) & (ratio < 1))
+            for _ in range(100):
+                if active.size == 0:
+                    break
+                x_active = x[active]
+                step = (np.log(x_active) + 1 - x_active - flat_target[active]) / (1 / x_active - 1)
+                x[active] = x_active - step
+                active = active[np.abs(step) > 1e-13 * x_active]
+            return x.reshape(target.shape)
+        
+        rise = np.minimum(newton(np.exp(target - 1)), 1.0)
+        fall = np.minimum(np.maximum(newton(4 - 2 * target), 1.0), cutoff)
+        
+        hours = (fall - rise) * Tp
+        hours = np.where(ratio >= 1, 0.0, np.where(ratio <= 0, cutoff * Tp, hours))
+        summary['hours_above_threshold'] = hours
+    
+    return summary
+
+
+@timed("adaptive_ordinates")
+def adaptive_ordinates(m, tolerance=1e-3, duration=5, reference_points=20001):
+    """
+    Sample the dimensionless unit hydrograph on an adaptive, non-uniform grid
+    
+    Points are placed so that linear interpolation between them stays within
+    `tolerance` of Q/Qp: dense on the rising limb and around the peak, sparse
+    on the recession. Spacing follows the local curvature (interpolation
+    error ≈ h² |f''| / 8) and is then refined until the error, checked on a
+    dense reference grid, meets the tolerance.
+    
+    Args:
+        m: Gamma shape factor
+        tolerance: Maximum interpolation error in Q/Qp units (default=1e-3)
+        duration: Duration multiple of Tp (default=5)
+        reference_points: Size of the dense grid used to place and check points
+        
+    Returns:
+        t_ratio: Array of t/Tp sample locations (includes 0, the peak and the end)
+        flow_ratio: Q/Qp at those locations
+    """
+    def curve(x):
+        # Q/Qp = ((t/Tp)^m) * exp(m * (1 - t/Tp)), zero past t/Tp > 5
+        q = np.power(x, m) * np.exp(m * (1 - x))
+        return np.where(x > 5, 0.0, q)
+    
+    # Last sample lies within the hydrograph, as in generate_hydrograph
+    end = min(duration, 5)
+    reference = np.linspace(0, end, reference_points)
+    q_reference = curve(reference)
+    
+    # Curvature of Q/Qp: f'' = f * ((m/x - m)^2 - m/x^2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        curvature = np.abs(q_reference * ((m / reference - m) ** 2 - m / reference ** 2))
+    curvature = np.nan_to_num(curvature, nan=0.0, posinf=0.0)
+    
+    # Equidistribute sample density sqrt(|f''| / (8 * tolerance))
+    density = np.sqrt(curvature / (8 * tolerance))
+    cumulative = np.concatenate(([0], np.cumsum(0.5 * (density[1:] + density[:-1]) * np.diff(reference))))
+    n_points = max(int(np.ceil(cumulative[-1])), 1)
+    t_ratio = np.interp(np.arange(n_points + 1) * cumulative[-1] / n_points, cumulative, reference)
+    t_ratio = np.union1d(t_ratio, [0.0, 1.0, end])
+    
+    # Refine intervals where interpolation still misses the tolerance
+    for _ in range(50):
+        error = np.abs(np.interp(reference, t_ratio, curve(t_ratio)) - q_reference)
+        bad = error > tolerance
+        if not bad.any():
+            break
+        intervals = np.unique(np.searchsorted(t_ratio, reference[bad]) - 1)
+        midpoints = 0.5 * (t_ratio[intervals] + t_ratio[intervals + 1])
+        t_ratio = np.union1d(t_ratio, midpoints)
+    
+    return t_ratio, curve(t_ratio)
+
+
+def interpolate_to_uniform(time_hours, values, dt, end=None):
+    """
+    Linearly interpolate a non-uniform series onto a uniform time grid
+    
+    The result follows the piecewise-linear series, so for a series from
+    adaptive_ordinates it is only within the adaptive tolerance of the
+    analytic hydrograph. Use resample_to_uniform for exact values.
+    
+    Args:
+        time_hours: Non-uniform time array in hours (increasing)
+        values: Values at those times (1-D, or 2-D with time along axis 0)
+        dt: Uniform time step in hours
+        end: Optional end time (default: last time in the series)
+        
+    Returns:
+        uniform_time: Uniform time array from 0 with step dt
+        uniform_values: Values interpolated onto that grid (zero past the series end)
+    """
+    end = time_hours[-1] if end is None else end
+    uniform_time = np.arange(0, end, dt)
+    values = np.asarray(values, dtype=float)
+    
+    if values.ndim == 1:
+        return uniform_time, np.interp(uniform_time, time_hours, values, right=0.0)
+    columns = [np.interp(uniform_time, time_hours, values[:, i], right=0.0) for i in range(values.shape[1])]
+    return uniform_time, np.column_stack(columns)
+
+
+def resample_to_uniform(params, peak_flow_cfs, dt=None, duration=5):
+    """
+    Exact uniform-grid counterpart of generate_adaptive_hydrograph
+    
+    The DUH is analytic, so instead of interpolating the adaptive samples
+    the curve is evaluated at the uniform times from the same time
+    parameters and peak flow.
+    
+    Args:
+        params: TimeParameters (m, Tp and, by default, dt are used)
+        peak_flow_cfs: Peak flow in cubic feet per second (CFS)
+        dt: Uniform time step in hours (default: params.dt)
+        duration: Duration multiple of Tp (default=5)
+        
+    Returns:
+        time_hours: Uniform time array in hours
+        flow_m3s: Flow array in m³/s
+        flow_cfs: Flow array in CFS
+    """
+    dt = params.dt if dt is None else dt
+    flow_ratio = _duh_ordinates(params.m, dt / params.Tp, duration)
+    
+    flow_cfs = flow_ratio * peak_flow_cfs
+    flow_m3s = flow_cfs * CFS_TO_M3S
+    
+    return np.arange(len(flow_ratio)) * dt, flow_m3s, flow_cfs
+
+
+def design_hyetograph(total_depth_in, dt_hours, distribution=TYPE_II_24HR):
+    """
+    Build an incremental design hyetograph from a cumulative rainfall distribution
+    
+    Args:
+        total_depth_in: Total storm depth in inches
+        dt_hours: Time step in hours
+        distribution: (hours, cumulative fraction) pair of sequences
+            (default: SCS Type II 24-hour)
+            
+    Returns:
+        Incremental rainfall depth in inches for each time step
+    """
+    hours, fractions = (np.asarray(values, dtype=float) for values in distribution)
+    
+    # Interpolate the cumulative curve at step boundaries and difference it
+    boundaries = np.append(np.arange(0, hours[-1], dt_hours), hours[-1])
+    cumulative = total_depth_in * np.interp(boundaries, hours, fractions)
+    
+    return np.diff(cumulative)
+
+
+def scs_runoff_excess(precip_in, S_in, ia_ratio=0.2):
+    """
+    Compute incremental SCS-CN runoff excess from incremental rainfall
+    
+    Args:
+        precip_in: Incremental rainfall depth in inches for each time step
+        S_in: Potential maximum retention in inches
+        ia_ratio: Initial abstraction as a fraction of S (default=0.2)
+        
+    Returns:
+        Incremental runoff excess in inches for each time step
+    """
+    # Q = (P - Ia)² / (P - Ia + S) on cumulative rainfall, zero until P exceeds Ia
+    cumulative_precip = np.cumsum(precip_in)
+    effective = np.maximum(cumulative_precip - ia_ratio * S_in, 0)
+    cumulative_runoff = effective ** 2 / (effective + S_in)
+    
+    return np.diff(cumulative_runoff, prepend=0)
+
+
+@timed("convolve_hydrograph")
+def convolve_hydrograph(excess, unit_hydrograph, method="auto"):
+    """
+    Convolve a runoff excess series with a unit hydrograph
+    
+    Args:
+        excess: Runoff excess depth per time step
+        unit_hydrograph: Unit hydrograph ordinates (flow per unit depth)
+        method: "direct", "fft", or "auto" to use FFT once both series are
+            at least FFT_CONVOLUTION_THRESHOLD long
+            
+    Returns:
+        Flow series of length len(excess) + len(unit_hydrograph) - 1
+    """
+    excess = np.asarray(excess, dtype=float)
+    unit_hydrograph = np.asarray(unit_hydrograph, dtype=float)
+    
+    if method == "auto":
+        method = "fft" if min(len(excess), len(unit_hydrograph)) >= FFT_CONVOLUTION_THRESHOLD else "direct"
+    
+    if method == "direct":
+        return np.convolve(excess, unit_hydrograph)
+    elif method == "fft":
+        n_out = len(excess) + len(unit_hydrograph) - 1
+        n_fft = 1 << (n_out - 1).bit_length()
+        flow = np.fft.irfft(np.fft.rfft(excess, n_fft) * np.fft.rfft(unit_hydrograph, n_fft), n_fft)[:n_out]
+        
+        # Remove round-off below zero; both inputs are non-negative
+        return np.maximum(flow, 0)
+    else:
+        raise ValueError("Invalid convolution method. Use 'direct', 'fft' or 'auto'.")
+
+
+class HydrographResult:
+    """
+    Compact set of hydrographs that share one dimensionless shape.
+    
+    Stores a single time vector, a single Q/Qp ordinate vector and one peak
+    flow per hydrograph. Flow series, tables and unit conversions are built
+    on demand, so memory grows with the number of time steps rather than
+    time steps × hydrographs × units.
+    """
+    
+    __slots__ = ('time_hours', 'ordinates', 'peaks_cfs', 'labels')
+    
+    def __init__(self, time_hours, ordinates, peaks_cfs, labels=None, dtype=np.float64):
+        """
+        Initialize the result
+        
+        Args:
+            time_hours: Time array in hours
+            ordinates: Q/Qp array on the same time grid
+            peaks_cfs: Peak flows in CFS, one per hydrograph
+            labels: Label per hydrograph, e.g. the AEP (default: 0, 1, 2, ...)
+            dtype: Storage dtype for the ordinates (np.float32 halves memory)
+        """
+        self.time_hours = np.asarray(time_hours, dtype=float)
+        self.ordinates = np.asarray(ordinates, dtype=dtype)
+        self.peaks_cfs = np.atleast_1d(np.asarray(peaks_cfs, dtype=float))
+        self.labels = list(labels) if labels is not None else list(range(len(self.peaks_cfs)))
+    
+    def __len__(self):
+        """Number of time steps"""
+        return len(self.time_hours)
+    
+    @property
+    def nbytes(self):
+        """Memory held by the stored arrays in bytes"""
+        return self.time_hours.nbytes + self.ordinates.nbytes + self.peaks_cfs.nbytes
+    
+    def flow_cfs(self, label=None):
+        """
+        Flow in CFS for one hydrograph, or a (time × hydrograph) matrix for all
+        
+        Args:
+            label: Hydrograph label; None returns all hydrographs
+        """
+        if label is None:
+            return np.outer(self.ordinates, self.peaks_cfs)
+        return self.ordinates * self.peaks_cfs[self.labels.index(label)]
+    
+    def flow_m3s(self, label=None):
+        """
+        Flow in m³/s for one hydrograph, or a (time × hydrograph) matrix for all
+        
+        Args:
+            label: Hydrograph label; None returns all hydrographs
+        """
+        if label is None:
+            return np.outer(self.ordinates, self.peaks_cfs * CFS_TO_M3S)
+        return self.ordinates * (self.peaks_cfs[self.labels.index(label)] * CFS_TO_M3S)
+    
+    def to_dataframe(self, units="Both", start=None, stop=None):
+        """
+        Build a wide table with a time column and one flow column per hydrograph
+        
+        Column names follow the app's export format ('Time(hr)',
+        '{label}yr_Flow(CFS)', '{label}yr_Flow(m3/s)').
+        
+        Args:
+            units: "CFS", "m³/s" or "Both"
+            start, stop: Optional range of time steps (rows) to include
+            
+        Returns:
+            pandas DataFrame
+        """
+        import pandas as pd
+        
+        rows = slice(start, stop)
+        ordinates = self.ordinates[rows]
+        columns = {'Time(hr)': self.time_hours[rows]}
+        for label, peak_cfs in zip(self.labels, self.peaks_cfs):
+            if units in ("CFS", "Both"):
+                columns[f"{label}yr_Flow(CFS)"] = ordinates * peak_cfs
+            if units in ("m³/s", "Both"):
+                columns[f"{label}yr_Flow(m3/s)"] = ordinates * (peak_cfs * CFS_TO_M3S)
+        
+        return pd.DataFrame(columns)
+
+
+@dataclass(frozen=True)
+class WatershedParameters:
+    """
+    Immutable watershed inputs
+    
+    Hashable, so results can be cached by value and instances shared
+    freely across threads. Use dataclasses.replace() to change a field.
+    """
+    area_mi2: float = 2.0  # catchment area in square miles
+    avg_slope: float = 2.0  # average catchment slope in %
+    cn: float = 80  # curve number (dimensionless)
+    S: float = 2.5  # potential maximum storage (mm)
+    method: str = "CN"  # CN or S
+    time_interval: float = 5.0  # time interval for hydrograph in minutes
+    m: float = 3.7  # gamma shape factor (3.7 for the standard NRCS unit hydrograph)
+
+
+@dataclass(frozen=True)
+class TimeParameters:
+    """
+    Immutable time parameters of a watershed, in hours
+    
+    Carries the gamma shape factor m and time step dt as well, so it fully
+    describes the hydrograph shape.
+    """
+    t_lag: float
+    tc: float
+    tr: float
+    Tp: float
+    dt: float
+    m: float = 3.7
+    
+    @property
+    def valid(self):
+        """Whether the NRCS dimensionless unit hydrograph is valid for these parameters"""
+        return not (self.tr > 0.2 * self.tc or self.tr > 0.3 * self.Tp)
+    
+    @property
+    def message(self):
+        """Validity message shown to users"""
+        if self.valid:
+            return "Parameters valid for NRCS dimensionless unit hydrograph"
+        return "Warning: NRCS dimensionless unit hydrograph may not be valid for these parameters"
+    
+    def as_table(self):
+        """Return the time parameters as a dictionary for display"""
+        return {
+            'Time Lag (hr)': round(self.t_lag, 3),
+            'Time of Concentration (hr)': round(self.tc, 3),
+            'Rainfall Duration (hr)': round(self.tr, 3),
+            'Time to Peak (hr)': round(self.Tp, 3)
+        }
+
+
+@timed("time_parameters")
+@lru_cache(maxsize=4096)
+def time_parameters(watershed):
+    """
+    Calculate all time parameters based on watershed characteristics
+    
+    Results are cached by value (WatershedParameters is hashable and
+    TimeParameters is immutable).
+    
+    Args:
+        watershed: WatershedParameters
+        
+    Returns:
+        TimeParameters
+    """
+    # Time lag based on method (shared with the batch engine)
+    t_lag = float(_compute_tlag(watershed.area_mi2, watershed.avg_slope, cn=watershed.cn, S=watershed.S,
+                                method=watershed.method))
+    
+    # Time of concentration, duration of rainfall excess and time to peak
+    tc = t_lag / 0.6
+    tr = 0.133 * tc
+    Tp = 0.5 * tr + t_lag
+    
+    # Time step in hours from the time interval in minutes
+    return TimeParameters(t_lag, tc, tr, Tp, watershed.time_interval / 60.0, watershed.m)
+
+
+@timed("dimensionless_ordinates")
+def dimensionless_ordinates(params, duration=5):
+    """
+    Evaluate the dimensionless unit hydrograph on the time grid
+    
+    Args:
+        params: TimeParameters (only m, dt and Tp are used)
+        duration: Duration multiple of Tp (default=5)
+        
+    Returns:
+        time_hours: Time array in hours
+        flow_ratio: Read-only Q/Qp array (dimensionless), shared via ORDINATE_CACHE
+    """
+    # Look up the shared Q/Qp curve for this shape (m, dt/Tp, duration)
+    flow_ratio = ORDINATE_CACHE.get(params.m, params.dt / params.Tp, duration)
+    
+    # Time array from 0 to duration*Tp with step dt
+    time_hours = np.arange(len(flow_ratio)) * params.dt
+    
+    return time_hours, flow_ratio
+
+
+@timed("generate_hydrograph")
+def generate_hydrograph(params, peak_flow_cfs, duration=5):
+    """
+    Generate the hydrograph for a given peak flow
+    
+    Args:
+        params: TimeParameters
+        peak_flow_cfs: Peak flow in cubic feet per second (CFS)
+        duration: Duration multiple of Tp (default=5)
+        
+    Returns:
+        time_hours: Time array in hours
+        flow_m3s: Flow array in m³/s
+        flow_cfs: Flow array in CFS
+    """
+    time_hours, flow_ratio = dimensionless_ordinates(params, duration)
+    
+    # Scale by peak flow to get actual hydrograph
+    flow_cfs = flow_ratio * peak_flow_cfs
+    flow_m3s = flow_cfs * CFS_TO_M3S
+    record_array("generate_hydrograph.flow", flow_cfs)
+    record_array("generate_hydrograph.flow", flow_m3s)
+    
+    return time_hours, flow_m3s, flow_cfs
+
+
+@timed("generate_hydrographs")
+def generate_hydrographs(params, peak_flows_cfs, duration=5):
+    """
+    Generate hydrographs for several peak flows sharing one time grid
+    
+    The dimensionless ordinates are evaluated once and scaled by every
+    peak flow as an outer product.
+    
+    Args:
+        params: TimeParameters
+        peak_flows_cfs: Sequence of peak flows in CFS (e.g. one per AEP)
+        duration: Duration multiple of Tp (default=5)
+        
+    Returns:
+        time_hours: Time array in hours
+        flow_m3s: Flow matrix in m³/s (time × peak flow)
+        flow_cfs: Flow matrix in CFS (time × peak flow)
+    """
+    time_hours, flow_ratio = dimensionless_ordinates(params, duration)
+    peaks_cfs = np.asarray(peak_flows_cfs, dtype=float)
+    
+    # Scale the shared ordinates by each peak flow
+    flow_cfs = np.outer(flow_ratio, peaks_cfs)
+    flow_m3s = np.outer(flow_ratio, peaks_cfs * CFS_TO_M3S)
+    record_array("generate_hydrographs.flow", flow_cfs)
+    record_array("generate_hydrographs.flow", flow_m3s)
+    
+    return time_hours, flow_m3s, flow_cfs
+
+
+def potential_retention_in(watershed):
+    """Return the potential maximum retention S in inches for the selected method"""
+    if watershed.method == "CN":
+        return 1000 / watershed.cn - 10
+    elif watershed.method == "S":
+        return watershed.S / 25.4
+    else:
+        raise ValueError("Invalid method. Use 'CN' or 'S'.")
+
+
+def unit_hydrograph(watershed, params=None, duration=5):
+    """
+    Generate the unit hydrograph for 1 inch of runoff excess per time step
+    
+    The peak is scaled so the discrete hydrograph volume equals 1 inch of
+    runoff over the catchment area.
+    
+    Args:
+        watershed: WatershedParameters
+        params: TimeParameters (default: calculated from the watershed)
+        duration: Duration multiple of Tp (default=5)
+        
+    Returns:
+        time_hours: Time array in hours
+        uh_cfs: Unit hydrograph ordinates in CFS per inch of runoff
+    """
+    if params is None:
+        params = time_parameters(watershed)
+    time_hours, flow_ratio = dimensionless_ordinates(params, duration)
+    
+    # Peak flow that makes the hydrograph volume equal 1 inch over the area
+    unit_peak_cfs = CFS_HR_PER_INCH_MI2 * watershed.area_mi2 / (flow_ratio.sum() * params.dt)
+    
+    return time_hours, flow_ratio * unit_peak_cfs
+
+
+@timed("generate_storm_hydrograph")
+def generate_storm_hydrograph(watershed, precip_in, params=None, duration=5, ia_ratio=0.2, convolution="auto"):
+    """
+    Generate the full storm hydrograph for a rainfall hyetograph
+    
+    Runoff excess is computed with the SCS-CN method from the selected
+    CN or S and convolved with the unit hydrograph.
+    
+    Args:
+        watershed: WatershedParameters
+        precip_in: Incremental rainfall depth in inches per time step
+            (same time interval as the watershed, see design_hyetograph)
+        params: TimeParameters (default: calculated from the watershed)
+        duration: Duration multiple of Tp for the unit hydrograph (default=5)
+        ia_ratio: Initial abstraction as a fraction of S (default=0.2)
+        convolution: "direct", "fft" or "auto" (default)
+        
+    Returns:
+        time_hours: Time array in hours
+        flow_m3s: Flow array in m³/s
+        flow_cfs: Flow array in CFS
+    """
+    if params is None:
+        params = time_parameters(watershed)
+    excess_in = scs_runoff_excess(precip_in, potential_retention_in(watershed), ia_ratio)
+    _, uh_cfs = unit_hydrograph(watershed, params, duration)
+    
+    flow_cfs = convolve_hydrograph(excess_in, uh_cfs, convolution)
+    flow_m3s = flow_cfs * CFS_TO_M3S
+    time_hours = np.arange(len(flow_cfs)) * params.dt
+    
+    return time_hours, flow_m3s, flow_cfs
+
+
+def generate_adaptive_hydrograph(params, peak_flow_cfs, tolerance=1e-3, duration=5):
+    """
+    Generate the hydrograph on an adaptive, non-uniform time grid
+    
+    Args:
+        params: TimeParameters (only m and Tp are used)
+        peak_flow_cfs: Peak flow in cubic feet per second (CFS)
+        tolerance: Maximum linear interpolation error as a fraction of the
+            peak flow (default=1e-3)
+        duration: Duration multiple of Tp (default=5)
+        
+    Returns:
+        time_hours: Non-uniform time array in hours
+        flow_m3s: Flow array in m³/s
+        flow_cfs: Flow array in CFS
+    """
+    t_ratio, flow_ratio = adaptive_ordinates(params.m, tolerance, duration)
+    
+    flow_cfs = flow_ratio * peak_flow_cfs
+    flow_m3s = flow_cfs * CFS_TO_M3S
+    
+    return t_ratio * params.Tp, flow_m3s, flow_cfs
+
+
+@timed("generate_result")
+def generate_result(params, peak_flows_cfs, labels=None, duration=5, dtype=np.float64):
+    """
+    Generate a compact HydrographResult for several peak flows
+    
+    Args:
+        params: TimeParameters
+        peak_flows_cfs: Sequence of peak flows in CFS (e.g. one per AEP)
+        labels: Label per peak flow, e.g. the AEP
+        duration: Duration multiple of Tp (default=5)
+        dtype: Storage dtype for the ordinates
+        
+    Returns:
+        HydrographResult
+    """
+    time_hours, flow_ratio = dimensionless_ordinates(params, duration)
+    return HydrographResult(time_hours, flow_ratio, peak_flows_cfs, labels, dtype)
+
+
 class NRCSHydrographGenerator:
     """
     Class to generate hydrographs using the NRCS Dimensionless Unit Hydrograph methodology.
+    
+    Compatibility wrapper around the module functions: inputs and calculated
+    time parameters are kept as attributes, and every method takes one
+    immutable snapshot of them and calls the function of the same name.
+    For sharing across threads or caching by value, use WatershedParameters
+    and the module functions directly.
     """
     
     def __init__(self):
         """Initialize the generator with default parameters"""
+        defaults = WatershedParameters()
+        
         # Standard NRCS dimensionless unit hydrograph parameter
-        self.m = 3.7  # for standard NRCS unit hydrograph
+        self.m = defaults.m
         
         # Default watershed parameters
-        self.area_mi2 = 2.0  # catchment area in square miles
-        self.cn = 80  # curve number (dimensionless)
-        self.avg_slope = 2.0  # average catchment slope in %
-        self.S = 2.5  # potential maximum storage (mm)
-        self.time_interval = 5.0  # time interval for hydrograph in minutes
+        self.area_mi2 = defaults.area_mi2
+        self.cn = defaults.cn
+        self.avg_slope = defaults.avg_slope
+        self.S = defaults.S
+        self.time_interval = defaults.time_interval
         
         # Calculation method
-        self.method = "CN"  # CN or S
+        self.method = defaults.method
         
         # Time parameters (will be calculated)
         self.t_lag = None
@@ -26,92 +1061,84 @@ class NRCSHydrographGenerator:
         self.tr = None
         self.Tp = None
         self.dt = None  # time step in hours
+    
+    def watershed(self):
+        """Return the current inputs as WatershedParameters"""
+        return WatershedParameters(self.area_mi2, self.avg_slope, self.cn, self.S, self.method,
+                                   self.time_interval, self.m)
+    
+    def time_params(self):
+        """Return the calculated time parameters as TimeParameters"""
+        return TimeParameters(self.t_lag, self.tc, self.tr, self.Tp, self.dt, self.m)
         
     def calculate_tlag(self):
         """
         Calculate time lag based on CN or S method
         Returns time lag in hours
         """
-        # Convert area from square miles to km²
-        area_km2 = self.area_mi2 * 2.58999
-        
-        # Compute hydraulic length L (meters)
-        L = 1740 * (area_km2 ** 0.6)
-        
-        # Compute time lag based on method
-        if self.method == "CN":
-            self.t_lag = 1.362e-3 * ((1000 / self.cn - 9) ** 0.7) * (L ** 0.8) / np.sqrt(self.avg_slope)
-        elif self.method == "S":
-            self.t_lag = 1.362e-3 * ((self.S / 25.4 + 1) ** 0.7) * (L ** 0.8) / np.sqrt(self.avg_slope)
-        else:
-            raise ValueError("Invalid method for time lag calculation. Use 'CN' or 'S'.")
+        self.t_lag = time_parameters(self.watershed()).t_lag
         
         return self.t_lag
         
     def calculate_time_parameters(self):
-        """Calculate all time parameters based on watershed characteristics"""
-        # Calculate time lag if not already done
-        if self.t_lag is None:
-            self.calculate_tlag()
-        
-        # Estimate time of concentration (tc)
-        self.tc = self.t_lag / 0.6
-        
-        # Compute duration of rainfall excess (tr)
-        self.tr = 0.133 * self.tc
-        
-        # Compute time to peak (Tp)
-        self.Tp = 0.5 * self.tr + self.t_lag
-        
-        # Set time step based on user's time interval (convert from minutes to hours)
-        self.dt = self.time_interval / 60.0
+        """
+        Calculate all time parameters based on watershed characteristics
         
-        # Verify NRCS dimensionless unit hydrograph validity
-        if self.tr > 0.2 * self.tc or self.tr > 0.3 * self.Tp:
-            return False, "Warning: NRCS dimensionless unit hydrograph may not be valid for these parameters"
+        Always recalculated from the current inputs, so changing an input
+        and calling this again never returns stale values.
+        """
+        params = time_parameters(self.watershed())
+        self.t_lag, self.tc, self.tr, self.Tp, self.dt = params.t_lag, params.tc, params.tr, params.Tp, params.dt
         
-        return True, "Parameters valid for NRCS dimensionless unit hydrograph"
+        return params.valid, params.message
+            
+    def dimensionless_ordinates(self, duration=5):
+        """Evaluate the dimensionless unit hydrograph (see dimensionless_ordinates)"""
+        return dimensionless_ordinates(self.time_params(), duration)
             
     def generate_hydrograph(self, peak_flow_cfs, duration=5):
+        """Generate the hydrograph for a given peak flow (see generate_hydrograph)"""
+        return generate_hydrograph(self.time_params(), peak_flow_cfs, duration)
+    
+    def generate_hydrographs(self, peak_flows_cfs, duration=5):
+        """Generate hydrographs for several peak flows (see generate_hydrographs)"""
+        return generate_hydrographs(self.time_params(), peak_flows_cfs, duration)
+    
+    def potential_retention_in(self):
+        """Return the potential maximum retention S in inches for the selected method"""
+        return potential_retention_in(self.watershed())
+    
+    def unit_hydrograph(self, duration=5):
+        """Generate the unit hydrograph for 1 inch of runoff excess (see unit_hydrograph)"""
+        return unit_hydrograph(self.watershed(), self.time_params(), duration)
+    
+    def generate_storm_hydrograph(self, precip_in, duration=5, ia_ratio=0.2, convolution="auto"):
+        """Generate the full storm hydrograph for a hyetograph (see generate_storm_hydrograph)"""
+        return generate_storm_hydrograph(self.watershed(), precip_in, self.time_params(), duration, ia_ratio,
+                                         convolution)
+    
+    def generate_adaptive_hydrograph(self, peak_flow_cfs, tolerance=1e-3, duration=5):
+        """Generate the hydrograph on an adaptive time grid (see generate_adaptive_hydrograph)"""
+        return generate_adaptive_hydrograph(self.time_params(), peak_flow_cfs, tolerance, duration)
+    
+    def generate_result(self, peak_flows_cfs, labels=None, duration=5, dtype=np.float64):
+        """Generate a compact HydrographResult for several peak flows (see generate_result)"""
+        return generate_result(self.time_params(), peak_flows_cfs, labels, duration, dtype)
+    
+    def summarize(self, peak_flows_cfs, threshold_cfs=None, duration=5):
         """
-        Generate the hydrograph for a given peak flow
+        Summarize hydrographs for a vector of peak flows without building time series
         
         Args:
-            peak_flow_cfs: Peak flow in cubic feet per second (CFS)
+            peak_flows_cfs: Peak flows in CFS (scalar or sequence, e.g. one per AEP)
+            threshold_cfs: Optional flow threshold in CFS for hours above threshold
             duration: Duration multiple of Tp (default=5)
             
         Returns:
-            time_hours: Time array in hours
-            flow_m3s: Flow array in m³/s
-            flow_cfs: Flow array in CFS
+            Dictionary of NumPy arrays (see summarize_hydrographs)
         """
-        # Convert peak flow from CFS to m³/s
-        peak_flow_m3s = peak_flow_cfs * 0.0283168
-        
-        # Create time array from 0 to duration*Tp with step dt
-        time_hours = np.arange(0, duration * self.Tp, self.dt)
-        
-        # Calculate flow using gamma function
-        # Q/Qp = ((t/Tp)^m) * exp(m * (1 - t/Tp))
-        t_ratio = time_hours / self.Tp
-        flow_ratio = np.power(t_ratio, self.m) * np.exp(self.m * (1 - t_ratio))
-        
-        # Set values to zero for t > duration*Tp or t/Tp > 5 (end of hydrograph)
-        flow_ratio[t_ratio > 5] = 0
-        
-        # Scale by peak flow to get actual hydrograph
-        flow_m3s = flow_ratio * peak_flow_m3s
-        
-        # Convert back to CFS for user convenience
-        flow_cfs = flow_m3s * 35.3147
-        
-        return time_hours, flow_m3s, flow_cfs
+        return summarize_hydrographs(self.Tp, peak_flows_cfs, self.m, threshold_cfs, duration)
     
     def get_time_parameters(self):
         """Return calculated time parameters as a dictionary"""
-        return {
-            'Time Lag (hr)': round(self.t_lag, 3),
-            'Time of Concentration (hr)': round(self.tc, 3),
-            'Rainfall Duration (hr)': round(self.tr, 3),
-            'Time to Peak (hr)': round(self.Tp, 3)
-        }
+        return self.time_params().as_table()
@@ -0,0 +1,342 @@
+"""
+Calibration of the NRCS dimensionless unit hydrograph to observed events.
+
+Watershed parameters (CN or S, average slope and the m shape factor) are
+back-calculated from gauged hydrographs. A coarse grid of candidate
+parameter sets is evaluated as one broadcast array computation (candidates
+× observed time steps), then the grid is repeatedly refined around the best
+candidate. Every evaluated candidate is kept, and the ones whose fit is
+statistically indistinguishable from the best form the confidence region.
+
+CN (or S) and the average slope only act through the time lag, so fitting
+both at once leaves a ridge of equally good solutions; fit one of them
+together with m and fix the other in the WatershedParameters passed in.
+"""
+
+from dataclasses import replace
+from statistics import NormalDist
+
+import numpy as np
+
+from nrcs_calculator import WatershedParameters, calculate_time_parameters_batch, time_parameters
+
+# Default search range for each parameter that can be calibrated
+SEARCH_RANGES = {
+    'cn': (40.0, 98.0),
+    'S': (1.0, 500.0),
+    'avg_slope': (0.1, 30.0),
+    'm': (1.5, 10.0)
+}
+
+# Candidates × time steps evaluated per array operation (bounds temporary memory)
+CHUNK_ELEMENTS = 2_000_000
+
+# Named objectives (all expressed as losses, lower is better)
+OBJECTIVES = ("nse", "peak", "volume")
+
+
+def _trapezoid(values, time_hours):
+    """Trapezoidal integral over the last axis"""
+    return 0.5 * ((values[..., 1:] + values[..., :-1]) * np.diff(time_hours)).sum(axis=-1)
+
+
+def _chi2_quantile(probability, dof):
+    """Chi-square quantile by the Wilson-Hilferty approximation"""
+    z = NormalDist().inv_cdf(probability)
+    return dof * (1 - 2 / (9 * dof) + z * np.sqrt(2 / (9 * dof))) ** 3
+
+
+def _candidate_shapes(time_hours, Tp, m, duration):
+    """
+    Q/Qp of every candidate on the observed time steps
+
+    Args:
+        time_hours: Observed times in hours (n,)
+        Tp: Time to peak per candidate (c,)
+        m: Shape factor per candidate (c,)
+        duration: Duration multiple of Tp after which flow is zero
+
+    Returns:
+        Array of shape (c, n); zero past the end of the generated hydrograph
+        (t/Tp >= duration) and past t/Tp = 5, as in generate_hydrograph
+    """
+    ratio = time_hours[None, :] / Tp[:, None]
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        shape = np.power(ratio, m[:, None]) * np.exp(m[:, None] * (1 - ratio))
+    shape[(ratio >= duration) | (ratio > 5) | ~np.isfinite(shape)] = 0.0
+    return shape
+
+
+def _peak_flows(shape, observed, time_hours, peak):
+    """
+    Peak flow per candidate for the selected peak mode
+
+    Args:
+        shape: Candidate Q/Qp values (c, n)
+        observed: Observed flows (n,)
+        time_hours: Observed times (n,)
+        peak: "observed" (observed maximum), "volume" (match the observed
+            volume), "fit" (least-squares scale) or a fixed peak flow in CFS
+    """
+    if peak == "observed":
+        return np.full(len(shape), observed.max())
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if peak == "volume":
+            return _trapezoid(observed, time_hours) / _trapezoid(shape, time_hours)
+        if peak == "fit":
+            return (shape @ observed) / np.einsum('ij,ij->i', shape, shape)
+    if isinstance(peak, str):
+        raise ValueError("Invalid peak mode. Use 'observed', 'volume', 'fit' or a peak flow in CFS.")
+    return np.full(len(shape), float(peak))
+
+
+def _losses(simulated, observed, time_hours):
+    """
+    Named losses of simulated hydrographs against one observed event
+
+    Returns:
+        Dictionary with 'sse', 'nse' (1 - NSE), 'peak' (relative peak flow
+        error) and 'volume' (relative volume error), each of shape (c,)
+    """
+    residual = simulated - observed
+    sse = np.einsum('ij,ij->i', residual, residual)
+    sst = ((observed - observed.mean()) ** 2).sum()
+    observed_peak = observed.max()
+    observed_volume = _trapezoid(observed, time_hours)
+    return {
+        'sse': sse,
+        'nse': sse / sst,
+        'peak': np.abs(simulated.max(axis=1) - observed_peak) / observed_peak,
+        'volume': np.abs(_trapezoid(simulated, time_hours) - observed_volume) / observed_volume
+    }
+
+
+def _combine(losses, objective, simulated, observed, time_hours):
+    """Reduce the named losses to the loss being minimized"""
+    if callable(objective):
+        return np.asarray(objective(simulated, observed, time_hours), dtype=float)
+    if isinstance(objective, str):
+        objective = {objective: 1.0}
+    unknown = set(objective) - set(OBJECTIVES)
+    if unknown:
+        raise ValueError(f"Unknown objective {sorted(unknown)}. Use {', '.join(OBJECTIVES)} or a callable.")
+    return sum(weight * losses[name] for name, weight in objective.items())
+
+
+class _Problem:
+    """Observed events, fixed watershed inputs and settings shared by every evaluation"""
+
+    def __init__(self, events, watershed, fit, objective, peak, duration):
+        self.events = []
+        for time_hours, observed in events:
+            time_hours = np.asarray(time_hours, dtype=float)
+            observed = np.asarray(observed, dtype=float)
+            if time_hours.shape != observed.shape or time_hours.ndim != 1 or len(time_hours) < 3:
+                raise ValueError("Each event needs matching 1-D time and flow arrays with at least 3 values.")
+            if not observed.max() > 0:
+                raise ValueError("Observed flows must have a positive peak.")
+            self.events.append((time_hours, observed))
+
+        self.fit = list(fit)
+        unknown = set(self.fit) - set(SEARCH_RANGES)
+        if unknown:
+            raise ValueError(f"Cannot calibrate {sorted(unknown)}. Choose from {', '.join(SEARCH_RANGES)}.")
+        if "cn" in self.fit and "S" in self.fit:
+            raise ValueError("Calibrate either 'cn' or 'S', not both.")
+
+        # Calibrating S implies the S method, calibrating cn the CN method
+        if "S" in self.fit:
+            watershed = replace(watershed, method="S")
+        elif "cn" in self.fit:
+            watershed = replace(watershed, method="CN")
+        self.watershed = watershed
+        self.objective = objective
+        self.peak = peak
+        self.duration = duration
+        self.n_observations = sum(len(time_hours) for time_hours, _ in self.events)
+
+    def evaluate(self, candidates):
+        """
+        Evaluate candidate parameter sets against every event
+
+        Args:
+            candidates: Array (c, p) with one column per fitted parameter
+
+        Returns:
+            Tuple of (loss, sse) arrays of shape (c,), summed over events
+        """
+        values = {name: candidates[:, i] for i, name in enumerate(self.fit)}
+        w = self.watershed
+        Tp = calculate_time_parameters_batch(
+            w.area_mi2,
+            values.get('avg_slope', w.avg_slope),
+            w.time_interval,
+            cn=values.get('cn', w.cn),
+            S=values.get('S', w.S),
+            method=w.method
+        )['Tp']
+        Tp = np.broadcast_to(Tp, len(candidates))
+        m = np.broadcast_to(np.asarray(values.get('m', w.m), dtype=float), len(candidates))
+
+        loss = np.zeros(len(candidates))
+        sse = np.zeros(len(candidates))
+        for time_hours, observed in self.events:
+            # Chunk candidates so candidates × time steps stays bounded
+            chunk = max(CHUNK_ELEMENTS // len(time_hours), 1)
+            for start in range(0, len(candidates), chunk):
+                rows = slice(start, start + chunk)
+                shape = _candidate_shapes(time_hours, Tp[rows], m[rows], self.duration)
+                simulated = shape * _peak_flows(shape, observed, time_hours, self.peak)[:, None]
+                losses = _losses(simulated, observed, time_hours)
+                loss[rows] += _combine(losses, self.objective, simulated, observed, time_hours)
+                sse[rows] += losses['sse']
+
+        # Candidates that produce no flow (or NaN losses) can never be best
+        loss[~np.isfinite(loss)] = np.inf
+        sse[~np.isfinite(sse)] = np.inf
+        return loss, sse
+
+    def metrics(self, parameters):
+        """NSE, peak error, volume error and peak flow per event for one parameter set"""
+        w = replace(self.watershed, **parameters)
+        Tp = time_parameters(w).Tp
+        metrics = {'nse': [], 'peak_error': [], 'volume_error': [], 'peak_flow_cfs': []}
+        for time_hours, observed in self.events:
+            shape = _candidate_shapes(time_hours, np.array([Tp]), np.array([w.m]), self.duration)
+            peak_flow = _peak_flows(shape, observed, time_hours, self.peak)
+            losses = _losses(shape * peak_flow[:, None], observed, time_hours)
+            metrics['nse'].append(1 - losses['nse'][0])
+            metrics['peak_error'].append(losses['peak'][0])
+            metrics['volume_error'].append(losses['volume'][0])
+            metrics['peak_flow_cfs'].append(peak_flow[0])
+        return {key: np.array(value) for key, value in metrics.items()}
+
+
+def _grid(lows, highs, points):
+    """All combinations of evenly spaced values between lows and highs, shape (points^p, p)"""
+    axes = [np.linspace(low, high, points) for low, high in zip(lows, highs)]
+    return np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, len(axes))
+
+
+def _calibrate(problem, ranges, grid_points, refine_rounds, refine_points, confidence, region_tolerance):
+    """Grid search, local refinement and confidence region for one problem"""
+    search = dict(SEARCH_RANGES)
+    search.update(ranges or {})
+    lows = np.array([search[name][0] for name in problem.fit], dtype=float)
+    highs = np.array([search[name][1] for name in problem.fit], dtype=float)
+
+    # Coarse grid over the full search range in one broadcast evaluation
+    candidates = _grid(lows, highs, grid_points)
+    loss, sse = problem.evaluate(candidates)
+    evaluated, losses, sses = [candidates], [loss], [sse]
+    best = candidates[np.argmin(loss)]
+    half_width = (highs - lows) / (grid_points - 1)
+
+    # Refine: re-grid a box of one previous grid step around the best candidate
+    for _ in range(refine_rounds):
+        candidates = _grid(np.maximum(best - half_width, lows), np.minimum(best + half_width, highs), refine_points)
+        loss, sse = problem.evaluate(candidates)
+        evaluated.append(candidates)
+        losses.append(loss)
+        sses.append(sse)
+        if loss.min() <= np.concatenate(losses[:-1]).min():
+            best = candidates[np.argmin(loss)]
+        half_width = 2 * half_width / (refine_points - 1)
+
+    evaluated = np.concatenate(evaluated)
+    losses = np.concatenate(losses)
+    sses = np.concatenate(sses)
+    best_index = int(np.argmin(losses))
+    best = evaluated[best_index]
+
+    # Confidence region: likelihood ratio on the SSE for NSE fits, loss tolerance otherwise
+    if problem.objective == "nse":
+        n = problem.n_observations
+        threshold = sses[best_index] * np.exp(_chi2_quantile(confidence, len(problem.fit)) / n)
+        inside = sses <= threshold
+    else:
+        threshold = losses[best_index] + region_tolerance
+        inside = losses <= threshold
+    region = evaluated[inside]
+
+    parameters = {name: float(value) for name, value in zip(problem.fit, best)}
+    watershed = replace(problem.watershed, **parameters)
+    return {
+        'parameters': parameters,
+        'watershed': watershed,
+        'time_parameters': time_parameters(watershed),
+        'loss': float(losses[best_index]),
+        'metrics': problem.metrics(parameters),
+        'region': {
+            'bounds': {name: (float(region[:, i].min()), float(region[:, i].max()))
+                       for i, name in enumerate(problem.fit)},
+            'at_range_edge': {name: bool(np.isclose(region[:, i].min(), lows[i]) or
+                                         np.isclose(region[:, i].max(), highs[i]))
+                              for i, name in enumerate(problem.fit)},
+            'points': region,
+            'threshold': float(threshold)
+        },
+        'evaluations': len(evaluated)
+    }
+
+
+def calibrate(time_hours, observed_cfs, watershed=None, fit=("cn", "m"), objective="nse", peak="fit",
+              ranges=None, grid_points=25, refine_rounds=4, refine_points=11, duration=5, confidence=0.95,
+              region_tolerance=0.05):
+    """
+    Fit watershed parameters to one observed hydrograph
+
+    Args:
+        time_hours: Observed times in hours, starting at the beginning of the rise
+        observed_cfs: Observed flows in CFS (baseflow removed)
+        watershed: WatershedParameters with the area and the values of every
+            parameter that is not calibrated (default: WatershedParameters())
+        fit: Names of the parameters to calibrate ("cn" or "S", "avg_slope", "m")
+        objective: "nse", "peak" or "volume", a dictionary of weights such as
+            {"nse": 1.0, "volume": 0.5}, or a callable(simulated, observed,
+            time_hours) returning one loss per simulated row
+        peak: Peak flow of the simulated hydrograph: "fit" (least-squares
+            scale, default), "volume" (match the observed runoff volume),
+            "observed" (observed maximum) or a fixed value in CFS. Pinning
+            the peak to a noisy observed maximum biases the shape fit (m
+            high), and the region does not account for the peak's error.
+        ranges: Optional {parameter: (low, high)} overriding SEARCH_RANGES
+        grid_points: Coarse grid points per parameter
+        refine_rounds: Number of local refinement rounds
+        refine_points: Grid points per parameter in each refinement round
+        duration: Duration multiple of Tp after which simulated flow is zero
+        confidence: Confidence level of the region for NSE fits
+        region_tolerance: Loss margin defining the region for other objectives
+
+    Returns:
+        Dictionary with 'parameters' (best values), 'watershed' (calibrated
+        WatershedParameters), 'time_parameters', 'loss', 'metrics' (NSE, peak
+        and volume error and peak flow), 'region' (per-parameter bounds, edge
+        flags, accepted points and threshold) and 'evaluations'
+    """
+    problem = _Problem([(time_hours, observed_cfs)], watershed or WatershedParameters(), fit, objective, peak,
+                       duration)
+    return _calibrate(problem, ranges, grid_points, refine_rounds, refine_points, confidence, region_tolerance)
+
+
+def calibrate_events(events, watershed=None, fit=("cn", "m"), objective="nse", peak="fit", joint=False,
+                     ranges=None, grid_points=25, refine_rounds=4, refine_points=11, duration=5, confidence=0.95,
+                     region_tolerance=0.05):
+    """
+    Fit watershed parameters to many observed events of one basin
+
+    Args:
+        events: Sequence of (time_hours, observed_cfs) pairs
+        joint: If True, fit one parameter set minimizing the summed loss of
+            all events; otherwise fit every event separately
+        Other arguments as in calibrate (the peak mode applies per event)
+
+    Returns:
+        One calibrate result (joint=True, with per-event metric arrays) or a
+        list of results, one per event
+    """
+    watershed = watershed or WatershedParameters()
+    settings = (ranges, grid_points, refine_rounds, refine_points, confidence, region_tolerance)
+    if joint:
+        return _calibrate(_Problem(events, watershed, fit, objective, peak, duration), *settings)
+    return [_calibrate(_Problem([event], watershed, fit, objective, peak, duration), *settings) for event in events]
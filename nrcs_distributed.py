@@ -0,0 +1,590 @@
+"""
+Distributed ensemble runs for basin inventories.
+
+A watershed inventory (the batch_run.py input table) is split into shards
+of consecutive basins. Each shard runs a Monte Carlo ensemble per basin
+(see nrcs_ensemble) on a pluggable backend, and the results are written as
+checkpointed part files that merge_shards() combines.
+
+Sampling is seeded per basin from the run seed and the basin's row number,
+so results do not depend on the shard size, the backend or the order in
+which shards finish. Finished shards are recorded in a progress log; a
+failed shard is retried on its own and resume=True skips completed shards.
+
+Backends:
+    LocalBackend   Process pool on this machine
+    DaskBackend    dask.distributed scheduler (a LocalCluster by default)
+
+Example:
+    python nrcs_distributed.py watersheds.csv results/ --members 1000 \\
+        --uncertainty cn=normal,0,3 --uncertainty m=uniform,-0.5,0.5
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import fields
+
+import numpy as np
+import pandas as pd
+
+from batch_run import AEP_COLUMN_PATTERN, read_watershed_chunks, watershed_inputs
+from nrcs_calculator import NRCSHydrographGenerator, WatershedParameters, summarize_hydrographs
+from nrcs_ensemble import PARAMETER_BOUNDS, run_ensemble
+from nrcs_exports import write_table
+
+# Progress log and job description kept in the output directory
+PROGRESS_FILE = "progress.jsonl"
+JOB_FILE = "job.json"
+
+# Parameters of a distribution kind (after its name)
+DISTRIBUTION_ARGUMENTS = {"normal": 2, "lognormal": 2, "uniform": 2, "triangular": 3}
+
+# Loss-method parameter each method uses
+METHOD_PARAMETERS = {"CN": "cn", "S": "S"}
+
+
+class LocalBackend:
+    """
+    Run shards on a local process pool
+
+    Args:
+        workers: Number of worker processes (default: CPU count)
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = None
+
+    @property
+    def slots(self):
+        """Number of shards that can run at once"""
+        return self.workers
+
+    def start(self):
+        """Create the process pool"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def submit(self, func, *args):
+        """Submit a task and return its future"""
+        return self._executor.submit(func, *args)
+
+    def wait_any(self, futures):
+        """Block until at least one future finishes; return (done, not done)"""
+        return wait(futures, return_when=FIRST_COMPLETED)
+
+    def worker_lost(self, error):
+        """
+        Return True if the error is a dead worker process
+
+        A dead worker breaks the whole pool, so the error reaches every
+        in-flight shard, not only the one that killed the worker.
+        """
+        return isinstance(error, BrokenProcessPool)
+
+    def restart(self):
+        """Replace a broken pool (its in-flight shards are lost)"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def shutdown(self):
+        """Shut the process pool down"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+class DaskBackend:
+    """
+    Run shards on a dask.distributed cluster
+
+    Tasks lost with a failed worker are rescheduled by the scheduler, so
+    only that worker's shards are recomputed.
+
+    Args:
+        address: Scheduler address; None starts a LocalCluster
+        client: Existing dask.distributed Client (overrides address)
+        **cluster_options: Keyword arguments of LocalCluster (e.g. n_workers)
+    """
+
+    def __init__(self, address=None, client=None, **cluster_options):
+        try:
+            import distributed
+        except ImportError:
+            raise ImportError("The Dask backend requires dask.distributed. "
+                              "Try installing it with: pip install \"dask[distributed]\"")
+        self._distributed = distributed
+        self._owns_client = client is None
+        if client is None:
+            client = distributed.Client(address) if address else distributed.Client(
+                distributed.LocalCluster(**cluster_options))
+        self.client = client
+
+    @property
+    def slots(self):
+        """Number of shards that can run at once (total worker threads)"""
+        return max(sum(self.client.nthreads().values()), 1)
+
+    def start(self):
+        """Nothing to start; the client is connected on creation"""
+
+    def submit(self, func, *args):
+        """Submit a task and return its future"""
+        return self.client.submit(func, *args, pure=False)
+
+    def wait_any(self, futures):
+        """Block until at least one future finishes; return (done, not done)"""
+        result = self._distributed.wait(list(futures), return_when="FIRST_COMPLETED")
+        return set(result.done), set(result.not_done)
+
+    def worker_lost(self, error):
+        """The scheduler reschedules shards of lost workers itself"""
+        return False
+
+    def restart(self):
+        """Nothing to restart"""
+
+    def shutdown(self):
+        """Close the client (and its LocalCluster) if this backend created it"""
+        if self._owns_client:
+            cluster = self.client.cluster
+            self.client.close()
+            if cluster is not None:
+                cluster.close()
+
+
+def _centered(spec, nominal):
+    """
+    Turn a perturbation into an absolute distribution around a basin's value
+
+    Offsets of normal, uniform and triangular distributions are added to the
+    nominal value; lognormal perturbations multiply it.
+    """
+    kind = spec[0]
+    if kind == "lognormal":
+        return (kind, np.log(nominal) + spec[1], spec[2])
+    if kind == "normal":
+        return (kind, nominal + spec[1], spec[2])
+    if kind in ("uniform", "triangular"):
+        return (kind,) + tuple(nominal + value for value in spec[1:])
+    raise ValueError(f"Unknown distribution '{kind}'. Use normal, lognormal, uniform or triangular.")
+
+
+def _check_distributions(inventory, distributions, shard_size, time_interval, m):
+    """
+    Check the perturbations against the parameters and the inventory before a run
+
+    Catches what would otherwise only fail on the workers (after the retry
+    budget) or be silently ignored: unknown parameters or distributions,
+    and a cn or S perturbation on basins whose method uses the other one.
+
+    Args:
+        inventory: Path to the inventory
+        distributions: Parameter name -> perturbation (see run_distributed)
+        shard_size: Basins read at a time
+        time_interval: Default time interval in minutes
+        m: Default gamma shape factor
+
+    Raises:
+        ValueError: Describing the first problem found
+    """
+    parameters = [field.name for field in fields(WatershedParameters) if field.name in PARAMETER_BOUNDS]
+    unknown = sorted(set(distributions) - set(parameters))
+    if unknown:
+        raise ValueError(f"Cannot perturb {', '.join(unknown)}. Use {', '.join(parameters)}.")
+
+    for name, spec in distributions.items():
+        kind = spec[0] if spec else None
+        if kind not in DISTRIBUTION_ARGUMENTS:
+            raise ValueError(f"Unknown distribution '{kind}' for {name}. Use normal, lognormal, uniform or triangular.")
+        if len(spec) - 1 != DISTRIBUTION_ARGUMENTS[kind]:
+            raise ValueError(f"A {kind} distribution takes {DISTRIBUTION_ARGUMENTS[kind]} values, "
+                             f"{len(spec) - 1} given for {name}.")
+
+    # A cn perturbation has no effect on S-method basins and vice versa, so
+    # perturbing one of them requires every basin to use it
+    methods = [method for method, name in METHOD_PARAMETERS.items() if name in distributions]
+    if len(methods) != 1:
+        return
+    method = methods[0]
+    count, examples = 0, []
+    for _, basins in read_watershed_chunks(inventory, shard_size):
+        mismatch = watershed_inputs(basins, time_interval, m)['method'] != method
+        count += int(mismatch.sum())
+        examples += basins['basin_id'].to_numpy()[mismatch][:5 - len(examples)].tolist()
+    if count:
+        other = next(name for key, name in METHOD_PARAMETERS.items() if key != method)
+        raise ValueError(f"{count} basin(s) do not use the {method} method, e.g. basin_id {examples}, so the "
+                         f"{METHOD_PARAMETERS[method]} perturbation would have no effect on them. "
+                         f"Perturb {other} as well or split the inventory.")
+
+
+def run_shard(shard_index, basins, row_start, job):
+    """
+    Run the ensembles of one shard of basins
+
+    Runs on a backend worker.
+
+    Args:
+        shard_index: Shard number
+        basins: DataFrame of watersheds (batch_run.py columns)
+        row_start: Inventory row number of the first basin (seeds sampling)
+        job: Job settings (see run_distributed)
+
+    Returns:
+        Dictionary with the shard index, a 'summary' DataFrame (percentiles
+        of time to peak and runoff volume per basin and AEP) and, when
+        job['bands'] is set, a 'bands' DataFrame of percentile hydrographs
+    """
+    percentiles = job['percentiles']
+    aep_columns = [(column, int(match.group(1))) for column in basins.columns
+                   for match in [AEP_COLUMN_PATTERN.match(str(column))] if match]
+    summaries, bands = [], []
+
+    # Per-basin inputs with blank cells filled from the job defaults
+    inputs = watershed_inputs(basins, job['time_interval'], job['m'])
+
+    for offset, basin in enumerate(basins.to_dict("records")):
+        # Nominal parameters of this basin
+        generator = NRCSHydrographGenerator()
+        generator.area_mi2 = float(basin['area_mi2'])
+        generator.avg_slope = float(basin['avg_slope'])
+        if not np.isnan(inputs['cn'][offset]):
+            generator.cn = float(inputs['cn'][offset])
+        if not np.isnan(inputs['S'][offset]):
+            generator.S = float(inputs['S'][offset])
+        generator.method = str(inputs['method'][offset])
+        generator.time_interval = float(inputs['time_interval'][offset])
+        generator.m = float(inputs['m'][offset])
+
+        # Ensemble for a unit peak flow; flows scale linearly with each AEP's peak
+        seed = np.random.SeedSequence([job['seed'], row_start + offset])
+        distributions = {name: _centered(spec, getattr(generator, name))
+                         for name, spec in job['distributions'].items()}
+        ensemble = run_ensemble(generator, 1.0, distributions, n_members=job['n_members'],
+                                percentiles=percentiles, n_bins=job['n_bins'], duration=job['duration'],
+                                seed=seed, method=job['sampling'])
+        m_members = ensemble['samples'].get('m', np.full(job['n_members'], generator.m))
+        Tp_percentiles = np.percentile(ensemble['Tp'], percentiles)
+
+        for column, aep in aep_columns:
+            peak_flow_cfs = basin[column]
+            if pd.isna(peak_flow_cfs):
+                continue
+            volume = summarize_hydrographs(ensemble['Tp'], peak_flow_cfs, m_members, duration=job['duration'])['volume_ft3']
+            row = {'basin_id': basin['basin_id'], 'aep': aep, 'peak_flow_cfs': peak_flow_cfs}
+            for p, Tp_value, volume_value in zip(percentiles, Tp_percentiles, np.percentile(volume, percentiles)):
+                row[f"Tp_p{p:g}_hr"] = Tp_value
+                row[f"volume_p{p:g}_ft3"] = volume_value
+            summaries.append(row)
+
+            if job['bands']:
+                columns = {'basin_id': basin['basin_id'], 'aep': aep, 'time_hr': ensemble['time_hours'],
+                           'mean_cfs': ensemble['mean_cfs'] * peak_flow_cfs}
+                for p in percentiles:
+                    columns[f"p{p:g}_cfs"] = ensemble['percentiles_cfs'][p] * peak_flow_cfs
+                bands.append(pd.DataFrame(columns))
+
+    result = {'shard': shard_index, 'basins': len(basins), 'summary': pd.DataFrame(summaries)}
+    if job['bands']:
+        result['bands'] = pd.concat(bands, ignore_index=True) if bands else pd.DataFrame()
+    return result
+
+
+def _write_shard(output_dir, result, output_format):
+    """Checkpoint one shard: write its tables to temporary files and rename them into place"""
+    rows = 0
+    for name in ("summary", "bands"):
+        if name not in result:
+            continue
+        final_path = os.path.join(output_dir, f"{name}-{result['shard']:06d}.{output_format}")
+        temp_path = final_path + ".tmp"
+        write_table([result[name]], temp_path, output_format)
+        os.replace(temp_path, final_path)
+        rows += len(result[name])
+    return rows
+
+
+def _load_progress(output_dir):
+    """Return the set of shard indices recorded as finished"""
+    progress_path = os.path.join(output_dir, PROGRESS_FILE)
+    completed = set()
+    if os.path.exists(progress_path):
+        with open(progress_path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    completed.add(json.loads(line)["shard"])
+    return completed
+
+
+def run_distributed(inventory, output_dir, distributions, n_members=1000, percentiles=(5, 50, 95), seed=0,
+                    shard_size=100, backend=None, retries=2, resume=False, output_format="csv",
+                    time_interval=5.0, m=3.7, duration=5, n_bins=500, bands=True, sampling="lhs"):
+    """
+    Run per-basin ensembles for a watershed inventory across a backend
+
+    Args:
+        inventory: Path to a CSV or Parquet inventory (batch_run.py columns)
+        output_dir: Directory for part files, the progress log and job.json
+        distributions: Parameter name -> perturbation around each basin's
+            value, e.g. {"cn": ("normal", 0, 3), "m": ("uniform", -0.5, 0.5)}
+            (lognormal perturbations are multiplicative)
+        n_members: Ensemble members per basin
+        percentiles: Percentiles to report
+        seed: Run seed; each basin is seeded from it and its row number
+        shard_size: Basins per shard
+        backend: LocalBackend (default) or DaskBackend
+        retries: Extra attempts for a failed shard
+        resume: Skip shards already recorded in the progress log
+        output_format: "csv", "parquet" or "arrow"
+        time_interval: Default time interval in minutes
+        m: Default gamma shape factor
+        duration: Duration multiple of Tp
+        n_bins: Histogram bins of the percentile reduction
+        bands: Also write percentile hydrographs (not only summaries)
+        sampling: "lhs" or "random"
+
+    Returns:
+        Dictionary with shards completed, skipped and retried, basins and rows written
+
+    Raises:
+        ValueError: For perturbations the basins cannot use (checked before
+            anything is submitted) or settings that differ from a resumed run
+        RuntimeError: If a shard still fails after its retries
+    """
+    job = {
+        'distributions': {name: list(spec) for name, spec in distributions.items()},
+        'n_members': n_members,
+        'percentiles': list(percentiles),
+        'seed': seed,
+        'shard_size': shard_size,
+        'time_interval': time_interval,
+        'm': m,
+        'duration': duration,
+        'n_bins': n_bins,
+        'bands': bands,
+        'sampling': sampling
+    }
+
+    _check_distributions(inventory, distributions, shard_size, time_interval, m)
+
+    # The job description must match when resuming, or shards would mix settings
+    os.makedirs(output_dir, exist_ok=True)
+    job_path = os.path.join(output_dir, JOB_FILE)
+    if resume and os.path.exists(job_path):
+        with open(job_path) as f:
+            if json.load(f) != job:
+                raise ValueError(f"Settings differ from the run being resumed (see {job_path}).")
+        completed = _load_progress(output_dir)
+    else:
+        completed = set()
+        if os.path.exists(os.path.join(output_dir, PROGRESS_FILE)):
+            os.remove(os.path.join(output_dir, PROGRESS_FILE))
+    with open(job_path, "w") as f:
+        json.dump(job, f, indent=2)
+    job['distributions'] = {name: tuple(spec) for name, spec in job['distributions'].items()}
+
+    backend = backend or LocalBackend()
+    backend.start()
+    totals = {"shards": 0, "skipped": 0, "retried": 0, "basins": 0, "rows": 0}
+    start_time = time.time()
+
+    try:
+        with open(os.path.join(output_dir, PROGRESS_FILE), "a") as progress_log:
+            running = {}
+            attempts = {}
+            # Shards lost with a dead worker; run one at a time until the culprit is found
+            suspects = deque()
+            probing = False
+
+            def submit(task):
+                try:
+                    future = backend.submit(run_shard, *task, job)
+                except Exception as error:
+                    # The pool broke before its failures were collected; restart it
+                    if not backend.worker_lost(error):
+                        raise
+                    restart(error)
+                    suspects.appendleft(task)
+                    return
+                running[future] = task
+
+            def restart(error):
+                # Restarting loses every in-flight shard; none of them is known to be at fault
+                backend.restart()
+                suspects.extend(running.values())
+                totals["retried"] += len(running)
+                running.clear()
+                print(f"Worker pool failed ({type(error).__name__}); rerunning {len(suspects)} shards one at a time")
+
+            def charge(task, error):
+                # Count a failed attempt against the shard whose own run raised
+                shard_index = task[0]
+                attempts[shard_index] = attempts.get(shard_index, 1) + 1
+                if attempts[shard_index] > retries + 1:
+                    raise RuntimeError(f"Shard {shard_index} failed after {retries + 1} attempts") from error
+                totals["retried"] += 1
+                print(f"Shard {shard_index} failed ({type(error).__name__}: {error}); retrying")
+
+            def collect(done):
+                # Checkpoint finished shards; resubmit failed ones within the retry budget
+                nonlocal probing
+                failed, pool_error = [], None
+                for future in done:
+                    task = running.pop(future, None)
+                    if task is None:
+                        continue
+                    try:
+                        result = future.result()
+                    except Exception as error:
+                        if not backend.worker_lost(error):
+                            charge(task, error)
+                            failed.append(task)
+                        elif probing:
+                            # It ran alone, so it killed the worker; it runs alone again
+                            pool_error = error
+                            charge(task, error)
+                            suspects.appendleft(task)
+                        else:
+                            pool_error = error
+                            suspects.append(task)
+                            totals["retried"] += 1
+                        continue
+
+                    rows = _write_shard(output_dir, result, output_format)
+                    progress_log.write(json.dumps({"shard": result['shard'], "basins": result['basins'],
+                                                   "rows": rows}) + "\n")
+                    progress_log.flush()
+                    totals["shards"] += 1
+                    totals["basins"] += result['basins']
+                    totals["rows"] += rows
+                    elapsed = time.time() - start_time
+                    print(f"Shard {result['shard']} done: {totals['basins']} basins "
+                          f"({totals['basins'] / max(elapsed, 1e-9):.1f} basins/s)")
+
+                probing = False
+                if pool_error is not None:
+                    restart(pool_error)
+                for task in failed:
+                    submit(task)
+
+            def step():
+                # Run the next suspect once the pool is idle, otherwise wait for a shard
+                nonlocal probing
+                if suspects and not running:
+                    probing = True
+                    submit(suspects.popleft())
+                else:
+                    done, _ = backend.wait_any(list(running))
+                    collect(done)
+
+            row_start = 0
+            for shard_index, basins in read_watershed_chunks(inventory, shard_size):
+                task = (shard_index, basins, row_start)
+                row_start += len(basins)
+                if shard_index in completed:
+                    totals["skipped"] += 1
+                    continue
+
+                # Keep at most two shards per slot in flight (none while suspects are rerun)
+                while len(running) >= 2 * backend.slots or suspects or probing:
+                    step()
+                submit(task)
+
+            while running or suspects:
+                step()
+    finally:
+        backend.shutdown()
+
+    return totals
+
+
+def merge_shards(output_dir, table="summary"):
+    """
+    Combine the part files of a run into one DataFrame, in shard order
+
+    Args:
+        output_dir: Output directory of run_distributed
+        table: "summary" or "bands"
+
+    Returns:
+        pandas DataFrame
+    """
+    parts = sorted(name for name in os.listdir(output_dir)
+                   if name.startswith(f"{table}-") and not name.endswith(".tmp"))
+    frames = []
+    for name in parts:
+        path = os.path.join(output_dir, name)
+        if name.endswith(".csv"):
+            frames.append(pd.read_csv(path))
+        elif name.endswith(".parquet"):
+            frames.append(pd.read_parquet(path))
+        elif name.endswith(".arrow"):
+            import pyarrow as pa
+            with pa.OSFile(path, "rb") as source:
+                frames.append(pa.ipc.open_stream(source).read_pandas())
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def _parse_uncertainty(text):
+    """Parse 'name=kind,a,b[,c]' into (name, distribution tuple)"""
+    name, _, spec = text.partition("=")
+    kind, *values = spec.split(",")
+    return name.strip(), (kind.strip(),) + tuple(float(value) for value in values)
+
+
+def main(argv=None):
+    """Parse command-line arguments and run a distributed ensemble"""
+    parser = argparse.ArgumentParser(description="Run NRCS hydrograph ensembles for a watershed inventory.")
+    parser.add_argument("input", help="CSV or Parquet inventory of watersheds and per-AEP peak flows")
+    parser.add_argument("output_dir", help="Directory for part files and the progress log")
+    parser.add_argument("--uncertainty", action="append", type=_parse_uncertainty, default=[],
+                        help="Perturbation around each basin's value, e.g. cn=normal,0,3 (repeatable)")
+    parser.add_argument("--members", type=int, default=1000, help="Ensemble members per basin (default: 1000)")
+    parser.add_argument("--percentiles", default="5,50,95", help="Comma-separated percentiles (default: 5,50,95)")
+    parser.add_argument("--seed", type=int, default=0, help="Run seed (default: 0)")
+    parser.add_argument("--shard-size", type=int, default=100, help="Basins per shard (default: 100)")
+    parser.add_argument("--backend", choices=["local", "dask"], default="local", help="Execution backend (default: local)")
+    parser.add_argument("--workers", type=int, default=None, help="Workers for the local backend or a local Dask cluster")
+    parser.add_argument("--scheduler", default=None, help="Dask scheduler address (default: start a LocalCluster)")
+    parser.add_argument("--retries", type=int, default=2, help="Extra attempts for a failed shard (default: 2)")
+    parser.add_argument("--format", choices=["csv", "parquet", "arrow"], default="csv", help="Output format (default: csv)")
+    parser.add_argument("--no-bands", action="store_true", help="Only write summaries, not percentile hydrographs")
+    parser.add_argument("--resume", action="store_true", help="Skip shards completed by a previous run")
+    args = parser.parse_args(argv)
+
+    if args.backend == "dask":
+        options = {} if args.scheduler or not args.workers else {"n_workers": args.workers}
+        backend = DaskBackend(args.scheduler, **options)
+    else:
+        backend = LocalBackend(args.workers)
+
+    totals = run_distributed(
+        args.input,
+        args.output_dir,
+        dict(args.uncertainty),
+        n_members=args.members,
+        percentiles=[float(p) for p in args.percentiles.split(",")],
+        seed=args.seed,
+        shard_size=args.shard_size,
+        backend=backend,
+        retries=args.retries,
+        resume=args.resume,
+        output_format=args.format,
+        bands=not args.no_bands
+    )
+
+    print(f"\nFinished: {totals['shards']} shards, {totals['basins']} basins, {totals['rows']} rows "
+          f"({totals['skipped']} shards skipped, {totals['retried']} retries).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
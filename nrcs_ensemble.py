@@ -0,0 +1,233 @@
+"""
+Monte Carlo uncertainty analysis for the NRCS dimensionless unit hydrograph.
+
+Uncertain watershed parameters (CN or S, average slope and the m shape
+factor) are sampled from probability distributions, by simple random or
+Latin hypercube sampling. Ensemble members are evaluated in chunks as one
+broadcast array operation per chunk, and each chunk is immediately reduced
+into a per-time-step histogram of discharge, so percentile bands are
+obtained without holding the full member × time matrix in memory.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+
+from nrcs_calculator import CFS_TO_M3S, calculate_time_parameters_batch
+
+# Physically meaningful range for each sampled parameter (matches the app's input limits)
+PARAMETER_BOUNDS = {
+    'cn': (30.0, 100.0),
+    'S': (0.1, np.inf),
+    'avg_slope': (0.1, np.inf),
+    'm': (1.0, np.inf)
+}
+
+# Vectorized standard normal inverse CDF
+_normal_ppf = np.vectorize(NormalDist().inv_cdf, otypes=[float])
+
+
+def _inverse_cdf(spec, u):
+    """
+    Map uniform(0, 1) values through the inverse CDF of a distribution
+
+    Args:
+        spec: Distribution as a tuple: ("normal", mean, sd), ("lognormal", mu, sigma),
+            ("uniform", low, high) or ("triangular", low, mode, high)
+        u: Array of values in (0, 1)
+
+    Returns:
+        Array of samples
+    """
+    kind = spec[0]
+    if kind == "normal":
+        return spec[1] + spec[2] * _normal_ppf(u)
+    elif kind == "lognormal":
+        return np.exp(spec[1] + spec[2] * _normal_ppf(u))
+    elif kind == "uniform":
+        return spec[1] + (spec[2] - spec[1]) * u
+    elif kind == "triangular":
+        low, mode, high = spec[1:]
+        split = (mode - low) / (high - low)
+        return np.where(
+            u < split,
+            low + np.sqrt(u * (high - low) * (mode - low)),
+            high - np.sqrt((1 - u) * (high - low) * (high - mode))
+        )
+    else:
+        raise ValueError(f"Unknown distribution '{kind}'. Use normal, lognormal, uniform or triangular.")
+
+
+def sample_parameters(distributions, n_members, seed=None, method="lhs"):
+    """
+    Draw parameter samples for an ensemble
+
+    Args:
+        distributions: Dictionary of parameter name ('cn', 'S', 'avg_slope', 'm')
+            to distribution tuple (see _inverse_cdf)
+        n_members: Number of ensemble members
+        seed: Seed for reproducible sampling
+        method: "lhs" for Latin hypercube or "random" for simple random sampling
+
+    Returns:
+        Dictionary of parameter name to sample array, clipped to PARAMETER_BOUNDS
+    """
+    rng = np.random.default_rng(seed)
+    samples = {}
+
+    for name, spec in distributions.items():
+        if method == "lhs":
+            # One sample in each of n equal-probability strata, strata in random order
+            u = (rng.permutation(n_members) + rng.random(n_members)) / n_members
+        elif method == "random":
+            u = rng.random(n_members)
+        else:
+            raise ValueError("Invalid sampling method. Use 'lhs' or 'random'.")
+
+        # Keep u strictly inside (0, 1) for unbounded distributions
+        u = np.clip(u, 1e-12, 1 - 1e-12)
+        low, high = PARAMETER_BOUNDS.get(name, (-np.inf, np.inf))
+        samples[name] = np.clip(_inverse_cdf(spec, u), low, high)
+
+    return samples
+
+
+def _histogram_chunk(time_hours, Tp, m, peak_flow_cfs, n_bins, duration):
+    """
+    Evaluate a chunk of members on the common time grid and histogram the flows
+
+    Args:
+        time_hours: Common time grid in hours
+        Tp: Time to peak per member (hours)
+        m: Gamma shape factor per member
+        peak_flow_cfs: Peak flow in CFS
+        n_bins: Number of histogram bins spanning 0 to the peak flow
+        duration: Duration multiple of Tp
+
+    Returns:
+        counts: (time × bin) member counts
+        flow_sum: Sum of flows over members for each time step
+    """
+    # Broadcast members × time: Q/Qp = ((t/Tp)^m) * exp(m * (1 - t/Tp))
+    t_ratio = time_hours[None, :] / Tp[:, None]
+    flow_ratio = np.power(t_ratio, m[:, None]) * np.exp(m[:, None] * (1 - t_ratio))
+
+    # Each member's hydrograph ends at duration*Tp (and at t/Tp > 5)
+    flow_ratio[(t_ratio >= duration) | (t_ratio > 5)] = 0
+
+    # Bin index per (member, time); Q/Qp never exceeds 1
+    bins = np.minimum((flow_ratio * n_bins).astype(np.int64), n_bins - 1)
+    flat_index = np.arange(len(time_hours))[None, :] * n_bins + bins
+    counts = np.bincount(flat_index.ravel(), minlength=len(time_hours) * n_bins)
+
+    return counts.reshape(len(time_hours), n_bins), flow_ratio.sum(axis=0) * peak_flow_cfs
+
+
+def _percentiles_from_histogram(counts, percentiles, bin_width):
+    """
+    Interpolate percentiles from per-time-step histograms
+
+    Args:
+        counts: (time × bin) member counts
+        percentiles: Sequence of percentiles in [0, 100]
+        bin_width: Width of each bin in flow units
+
+    Returns:
+        Dictionary of percentile to flow array
+    """
+    cumulative = np.cumsum(counts, axis=1)
+    n_members = cumulative[:, -1:]
+    rows = np.arange(counts.shape[0])
+    bands = {}
+
+    for p in percentiles:
+        target = p / 100.0 * n_members
+        # First bin whose cumulative count reaches the target, then interpolate inside it
+        bin_index = np.minimum((cumulative < target).sum(axis=1), counts.shape[1] - 1)
+        below = np.where(bin_index > 0, cumulative[rows, bin_index - 1], 0)
+        in_bin = np.maximum(counts[rows, bin_index], 1)
+        fraction = np.clip((target[:, 0] - below) / in_bin, 0, 1)
+        bands[p] = (bin_index + fraction) * bin_width
+
+    return bands
+
+
+def run_ensemble(generator, peak_flow_cfs, distributions, n_members=10000, percentiles=(5, 50, 95),
+                 chunk_size=2000, n_bins=1000, duration=5, seed=None, method="lhs", workers=1):
+    """
+    Run a Monte Carlo ensemble and reduce it to percentile bands of discharge
+
+    Parameters without a distribution are taken from the generator. Members
+    are evaluated chunk by chunk (optionally on several worker processes) and
+    reduced into histograms with n_bins bins between zero and the peak flow,
+    so percentiles are resolved to peak_flow_cfs / n_bins.
+
+    Args:
+        generator: NRCSHydrographGenerator holding the nominal parameters
+        peak_flow_cfs: Peak flow in CFS
+        distributions: Dictionary of parameter name to distribution tuple
+            (see sample_parameters)
+        n_members: Number of ensemble members
+        percentiles: Percentiles to report (default 5, 50, 95)
+        chunk_size: Members evaluated per broadcast operation
+        n_bins: Histogram bins used for the percentile reduction
+        duration: Duration multiple of Tp (default=5)
+        seed: Seed for reproducible sampling
+        method: "lhs" or "random" sampling
+        workers: Number of worker processes (1 runs in this process)
+
+    Returns:
+        Dictionary with 'time_hours', 'percentiles_cfs' and 'percentiles_m3s'
+        (percentile -> flow array), 'mean_cfs', 'Tp' (per-member time to peak)
+        and 'samples' (the sampled parameters)
+    """
+    samples = sample_parameters(distributions, n_members, seed=seed, method=method)
+
+    # Member parameters, falling back to the generator's nominal values
+    def member_values(name, nominal):
+        return samples[name] if name in samples else np.full(n_members, nominal, dtype=float)
+
+    params = calculate_time_parameters_batch(
+        np.full(n_members, generator.area_mi2, dtype=float),
+        member_values('avg_slope', generator.avg_slope),
+        generator.time_interval,
+        cn=member_values('cn', generator.cn),
+        S=member_values('S', generator.S),
+        method=generator.method
+    )
+    Tp = params['Tp']
+    m = member_values('m', generator.m)
+
+    # Common time grid long enough for the slowest member
+    dt = generator.time_interval / 60.0
+    time_hours = np.arange(0, duration * Tp.max(), dt)
+
+    # Evaluate chunks and accumulate histograms
+    counts = np.zeros((len(time_hours), n_bins), dtype=np.int64)
+    flow_sum = np.zeros(len(time_hours))
+    starts = range(0, n_members, chunk_size)
+    tasks = [(time_hours, Tp[s:s + chunk_size], m[s:s + chunk_size], peak_flow_cfs, n_bins, duration) for s in starts]
+
+    if workers == 1:
+        results = (_histogram_chunk(*task) for task in tasks)
+        for chunk_counts, chunk_sum in results:
+            counts += chunk_counts
+            flow_sum += chunk_sum
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            for chunk_counts, chunk_sum in executor.map(_histogram_chunk, *zip(*tasks)):
+                counts += chunk_counts
+                flow_sum += chunk_sum
+
+    bands_cfs = _percentiles_from_histogram(counts, percentiles, peak_flow_cfs / n_bins)
+
+    return {
+        'time_hours': time_hours,
+        'percentiles_cfs': bands_cfs,
+        'percentiles_m3s': {p: flow * CFS_TO_M3S for p, flow in bands_cfs.items()},
+        'mean_cfs': flow_sum / n_members,
+        'Tp': Tp,
+        'samples': samples
+    }
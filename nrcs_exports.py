@@ -0,0 +1,262 @@
+"""
+Export writers for NRCS hydrograph results.
+
+Each writer streams its output in chunks of rows, so the full table is never
+rendered as one string in memory. The table writers (CSV, Parquet, Arrow)
+accept any iterable of pandas DataFrame chunks and are shared by the
+Streamlit app and the batch processor; the result writers add per-AEP CSV
+bundles and NetCDF with CF time metadata for HydrographResult objects.
+
+Parquet and Arrow output need pyarrow; NetCDF output needs netCDF4 (or
+scipy for NetCDF3 classic files).
+"""
+
+import io
+import zipfile
+
+import numpy as np
+
+from nrcs_calculator import CFS_TO_M3S
+
+# Rows written per chunk
+DEFAULT_CHUNK_ROWS = 50000
+
+
+def _import_pyarrow():
+    """Import pyarrow, with an install hint when it is missing"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet and Arrow export requires pyarrow. Try installing it with: pip install pyarrow")
+    return pyarrow
+
+
+def iter_result_chunks(result, units="Both", chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Yield the wide hydrograph table of a HydrographResult in row chunks
+
+    Args:
+        result: HydrographResult
+        units: "CFS", "m³/s" or "Both"
+        chunk_rows: Number of rows per chunk
+
+    Yields:
+        pandas DataFrame chunks with the columns of HydrographResult.to_dataframe
+    """
+    for start in range(0, max(len(result), 1), chunk_rows):
+        yield result.to_dataframe(units, start, start + chunk_rows)
+
+
+def write_csv_chunks(chunks, file):
+    """
+    Write DataFrame chunks as one CSV file
+
+    Args:
+        chunks: Iterable of DataFrames with identical columns
+        file: Path or open file object (text or binary)
+    """
+    if isinstance(file, str):
+        with open(file, "w", newline="") as f:
+            return write_csv_chunks(chunks, f)
+
+    binary = isinstance(file, (io.BufferedIOBase, io.RawIOBase)) or "b" in getattr(file, "mode", "")
+    for i, chunk in enumerate(chunks):
+        text = chunk.to_csv(index=False, header=(i == 0))
+        file.write(text.encode("utf-8") if binary else text)
+
+
+def write_parquet_chunks(chunks, file, compression="zstd"):
+    """
+    Write DataFrame chunks as one Parquet file, one row group per chunk
+
+    Args:
+        chunks: Iterable of DataFrames with identical columns
+        file: Path or binary file object
+        compression: Parquet compression codec (default: zstd)
+    """
+    pa = _import_pyarrow()
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pa.parquet.ParquetWriter(file, table.schema, compression=compression)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_arrow_chunks(chunks, file):
+    """
+    Write DataFrame chunks as an Arrow IPC stream, one record batch per chunk
+
+    Args:
+        chunks: Iterable of DataFrames with identical columns
+        file: Path or binary file object
+    """
+    pa = _import_pyarrow()
+    writer = None
+    try:
+        for chunk in chunks:
+            batch = pa.RecordBatch.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pa.ipc.new_stream(file, batch.schema)
+            writer.write_batch(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_table(chunks, file, output_format):
+    """
+    Write DataFrame chunks in a tabular format
+
+    Args:
+        chunks: Iterable of DataFrames with identical columns
+        file: Path or file object
+        output_format: "csv", "parquet" or "arrow"
+    """
+    writers = {"csv": write_csv_chunks, "parquet": write_parquet_chunks, "arrow": write_arrow_chunks}
+    if output_format not in writers:
+        raise ValueError("Invalid table format. Use 'csv', 'parquet' or 'arrow'.")
+    writers[output_format](chunks, file)
+
+
+def write_csv_zip(result, file, units="Both", chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Write a zip archive with one CSV file per AEP
+
+    Args:
+        result: HydrographResult
+        file: Path or binary file object
+        units: "CFS", "m³/s" or "Both"
+        chunk_rows: Number of rows per chunk
+    """
+    with zipfile.ZipFile(file, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for label, peak_cfs in zip(result.labels, result.peaks_cfs):
+            single = type(result)(result.time_hours, result.ordinates, [peak_cfs], [label],
+                                  dtype=result.ordinates.dtype)
+            with archive.open(f"{label}yr_hydrograph.csv", "w") as member:
+                write_csv_chunks(iter_result_chunks(single, units, chunk_rows), member)
+
+
+def write_netcdf(result, path, start_time=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Write a NetCDF file with CF time metadata
+
+    Flows are stored as (time, aep) variables in CFS and m³/s. Time is stored
+    as hours since start_time; without a start time a nominal 1970-01-01
+    reference is used and the values are hours since the hydrograph start.
+
+    Args:
+        result: HydrographResult
+        path: Output file path
+        start_time: Optional datetime of the first time step
+        chunk_rows: Number of time steps written per chunk
+    """
+    reference = start_time.strftime("%Y-%m-%d %H:%M:%S") if start_time is not None else "1970-01-01 00:00:00"
+    n_time, n_aep = len(result), len(result.labels)
+
+    try:
+        import netCDF4
+        dataset = netCDF4.Dataset(path, "w", format="NETCDF4")
+        create = lambda name, dims: dataset.createVariable(name, "f8", dims, zlib=True)
+    except ImportError:
+        try:
+            from scipy.io import netcdf_file
+        except ImportError:
+            raise ImportError("NetCDF export requires netCDF4 or scipy. Try installing it with: pip install netCDF4")
+        dataset = netcdf_file(path, "w")
+        create = lambda name, dims: dataset.createVariable(name, "f8", dims)
+
+    try:
+        dataset.Conventions = "CF-1.8"
+        dataset.title = "NRCS Dimensionless Unit Hydrographs"
+        dataset.createDimension("time", n_time)
+        dataset.createDimension("aep", n_aep)
+
+        time_var = create("time", ("time",))
+        time_var.units = f"hours since {reference}"
+        time_var.standard_name = "time"
+        time_var.axis = "T"
+        if start_time is None:
+            time_var.long_name = "time since start of hydrograph (reference date is nominal)"
+
+        aep_var = create("aep", ("aep",))
+        aep_var.units = "year"
+        aep_var.long_name = "annual exceedance probability return period"
+        aep_var[:] = np.asarray(result.labels, dtype=float)
+
+        variables = []
+        for name, units, factor in (("flow_cfs", "ft3 s-1", 1.0), ("flow_m3s", "m3 s-1", CFS_TO_M3S)):
+            var = create(name, ("time", "aep"))
+            var.units = units
+            var.standard_name = "water_volume_transport_in_river_channel"
+            variables.append((var, factor))
+
+        # Write the time series in chunks of rows
+        for start in range(0, n_time, chunk_rows):
+            stop = min(start + chunk_rows, n_time)
+            time_var[start:stop] = result.time_hours[start:stop]
+            flow = np.outer(result.ordinates[start:stop], result.peaks_cfs)
+            for var, factor in variables:
+                var[start:stop, :] = flow * factor
+    finally:
+        dataset.close()
+
+
+# Export formats offered to users: name -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Zipped CSV per AEP": ("zip", "application/zip"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Arrow": ("arrow", "application/vnd.apache.arrow.stream"),
+    "NetCDF": ("nc", "application/x-netcdf")
+}
+
+
+def available_formats():
+    """Return the export formats whose optional dependencies are installed"""
+    formats = ["CSV", "Zipped CSV per AEP"]
+    try:
+        _import_pyarrow()
+        formats += ["Parquet", "Arrow"]
+    except ImportError:
+        pass
+    try:
+        import netCDF4  # noqa: F401
+        formats.append("NetCDF")
+    except ImportError:
+        try:
+            from scipy.io import netcdf_file  # noqa: F401
+            formats.append("NetCDF")
+        except ImportError:
+            pass
+    return formats
+
+
+def export_result(result, file, export_format, units="Both", chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Write a HydrographResult in one of the EXPORT_FORMATS
+
+    Args:
+        result: HydrographResult
+        file: Path or binary file object (NetCDF needs a path)
+        export_format: Key of EXPORT_FORMATS
+        units: "CFS", "m³/s" or "Both" (tabular formats)
+        chunk_rows: Number of rows per chunk
+    """
+    if export_format == "CSV":
+        write_csv_chunks(iter_result_chunks(result, units, chunk_rows), file)
+    elif export_format == "Zipped CSV per AEP":
+        write_csv_zip(result, file, units, chunk_rows)
+    elif export_format == "Parquet":
+        write_parquet_chunks(iter_result_chunks(result, units, chunk_rows), file)
+    elif export_format == "Arrow":
+        write_arrow_chunks(iter_result_chunks(result, units, chunk_rows), file)
+    elif export_format == "NetCDF":
+        write_netcdf(result, file, chunk_rows=chunk_rows)
+    else:
+        raise ValueError(f"Unknown export format '{export_format}'. Use one of: {', '.join(EXPORT_FORMATS)}")
@@ -0,0 +1,184 @@
+"""
+Lightweight instrumentation for the NRCS hydrograph generator.
+
+Named stages are timed with time.perf_counter and array sizes are counted
+per name. Everything is off by default: a disabled stage() returns a shared
+no-op context manager and record_array() returns immediately, so the hooks
+can stay in hot paths. Enable globally with the NRCS_INSTRUMENT=1
+environment variable or enable(), or for the current thread only with
+run_timings() (used by the app's per-run timing panel).
+
+Collected totals can be exported as JSON (to_json) or in the Prometheus
+text exposition format (to_prometheus).
+"""
+
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+# Global switch; per-thread recording through run_timings() works regardless
+ENABLED = os.environ.get("NRCS_INSTRUMENT", "") not in ("", "0")
+
+_lock = threading.Lock()
+_local = threading.local()
+_NULL_STAGE = contextlib.nullcontext()
+
+# name -> [calls, total seconds, max seconds]
+_stages = {}
+
+# name -> [calls, elements, bytes]
+_arrays = {}
+
+
+def enable(flag=True):
+    """Turn global instrumentation on or off"""
+    global ENABLED
+    ENABLED = flag
+
+
+def is_active():
+    """Whether hooks currently record (globally or for this thread)"""
+    return ENABLED or getattr(_local, "recorder", None) is not None
+
+
+class _Stage:
+    """Context manager that times one stage and records it on exit"""
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        with _lock:
+            totals = _stages.setdefault(self.name, [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += elapsed
+            totals[2] = max(totals[2], elapsed)
+        recorder = getattr(_local, "recorder", None)
+        if recorder is not None:
+            recorder.append((self.name, elapsed))
+        return False
+
+
+def stage(name):
+    """
+    Time a named stage
+
+    Usage:
+        with stage("generate_hydrograph"):
+            ...
+
+    Returns a no-op context manager when instrumentation is inactive.
+    """
+    if not ENABLED and getattr(_local, "recorder", None) is None:
+        return _NULL_STAGE
+    return _Stage(name)
+
+
+def timed(name):
+    """Decorator that times every call of a function as a named stage"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED and getattr(_local, "recorder", None) is None:
+                return func(*args, **kwargs)
+            with _Stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_array(name, array):
+    """Count the elements and bytes of an array produced under a name"""
+    if not ENABLED and getattr(_local, "recorder", None) is None:
+        return
+    with _lock:
+        totals = _arrays.setdefault(name, [0, 0, 0])
+        totals[0] += 1
+        totals[1] += int(getattr(array, "size", 0))
+        totals[2] += int(getattr(array, "nbytes", 0))
+
+
+@contextlib.contextmanager
+def run_timings():
+    """
+    Record the stages timed by the current thread during a block
+
+    Works even when global instrumentation is disabled.
+
+    Yields:
+        List that receives (stage name, seconds) tuples in completion order
+    """
+    previous = getattr(_local, "recorder", None)
+    timings = []
+    _local.recorder = timings
+    try:
+        yield timings
+    finally:
+        _local.recorder = previous
+
+
+def reset():
+    """Clear all collected totals"""
+    with _lock:
+        _stages.clear()
+        _arrays.clear()
+
+
+def snapshot():
+    """Return the collected totals as a dictionary"""
+    with _lock:
+        return {
+            'stages': {
+                name: {'calls': calls, 'total_seconds': total, 'max_seconds': longest}
+                for name, (calls, total, longest) in _stages.items()
+            },
+            'arrays': {
+                name: {'calls': calls, 'elements': elements, 'bytes': nbytes}
+                for name, (calls, elements, nbytes) in _arrays.items()
+            }
+        }
+
+
+def to_json(path=None):
+    """
+    Dump the collected totals as JSON
+
+    Args:
+        path: Optional file to write; the JSON text is returned either way
+    """
+    text = json.dumps(snapshot(), indent=2)
+    if path is not None:
+        with open(path, "w") as f:
+            f.write(text)
+    return text
+
+
+def to_prometheus(prefix="nrcs"):
+    """Return the collected totals in the Prometheus text exposition format"""
+    data = snapshot()
+    metrics = (
+        ("stage_calls_total", "counter", "Number of times each stage ran", "stages", "stage", "calls"),
+        ("stage_seconds_total", "counter", "Total seconds spent in each stage", "stages", "stage", "total_seconds"),
+        ("stage_seconds_max", "gauge", "Longest single run of each stage in seconds", "stages", "stage", "max_seconds"),
+        ("array_elements_total", "counter", "Array elements produced under each name", "arrays", "array", "elements"),
+        ("array_bytes_total", "counter", "Array bytes allocated under each name", "arrays", "array", "bytes")
+    )
+
+    lines = []
+    for metric, kind, description, group, label, field in metrics:
+        lines.append(f"# HELP {prefix}_{metric} {description}")
+        lines.append(f"# TYPE {prefix}_{metric} {kind}")
+        for name, values in sorted(data[group].items()):
+            escaped = name.replace("\\", "\\\\").replace('"', '\\"')
+            lines.append(f'{prefix}_{metric}{{{label}="{escaped}"}} {values[field]}')
+    return "\n".join(lines) + "\n"
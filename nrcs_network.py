@@ -0,0 +1,345 @@
+"""
+Subbasin networks: NRCS hydrographs routed through reaches and summed at junctions.
+
+A network is a directed acyclic graph of elements, each flowing into at
+most one downstream element:
+
+    Subbasin   NRCS DUH hydrograph of one watershed (no inflows)
+    Reach      Sum of its inflows, routed with Muskingum or pure lag routing
+    Junction   Sum of its inflows
+
+Elements are immutable specifications. Every computed hydrograph is cached
+under a key built from the element's specification and the keys of its
+inflows (a Merkle tree), so after editing one subbasin only that subbasin
+and the elements downstream of it are recomputed. Independent branches
+run concurrently on a thread pool in topological order.
+
+Example:
+    network = Network(time_interval=5.0)
+    network.add("A", Subbasin(WatershedParameters(area_mi2=3.0), peak_flow_cfs=900), downstream="R1")
+    network.add("R1", Reach(Muskingum(K_hours=1.5, X=0.2)), downstream="J1")
+    network.add("B", Subbasin(WatershedParameters(area_mi2=5.0, cn=75), peak_flow_cfs=1200), downstream="J1")
+    network.add("J1", Junction())
+    flows = network.compute()
+"""
+
+import math
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, replace
+
+import numpy as np
+
+from nrcs_calculator import (
+    WatershedParameters,
+    generate_hydrograph,
+    generate_storm_hydrograph,
+    time_parameters
+)
+from nrcs_instrumentation import stage
+
+# Trailing routed flow below this fraction of the peak is trimmed
+TAIL_TOLERANCE = 1e-9
+
+
+@dataclass(frozen=True)
+class Muskingum:
+    """
+    Muskingum routing
+
+    K_hours: Travel time through the reach in hours
+    X: Weighting factor between inflow and outflow storage (0 to 0.5)
+    subreaches: Number of subreaches the reach is split into (K is divided
+        among them); None picks the fewest that keep every coefficient
+        non-negative at the network time step
+    """
+    K_hours: float
+    X: float = 0.2
+    subreaches: int = None
+
+    def route(self, inflow, dt):
+        """
+        Route an inflow hydrograph
+
+        Args:
+            inflow: Inflow in CFS on a uniform time grid
+            dt: Time step in hours
+
+        Returns:
+            Outflow in CFS (longer than the inflow by the recession tail)
+        """
+        subreaches = self.subreaches or max(1, int(math.ceil(2 * self.K_hours * self.X / dt - 1e-9)))
+        K = self.K_hours / subreaches
+        denominator = 2 * K * (1 - self.X) + dt
+        c0 = (dt - 2 * K * self.X) / denominator
+        c1 = (dt + 2 * K * self.X) / denominator
+        c2 = (2 * K * (1 - self.X) - dt) / denominator
+        if c0 < 0 or c2 < 0:
+            raise ValueError(f"Muskingum routing is unstable for K={K:g} hr, X={self.X:g} and dt={dt:g} hr "
+                             f"(needs 2KX <= dt <= 2K(1-X)); adjust subreaches or the time interval, "
+                             f"or use Lag routing for short reaches.")
+
+        # Extend the grid so the recession tail is kept
+        flow = np.concatenate([inflow, np.zeros(int(math.ceil(5 * self.K_hours / dt)))])
+        for _ in range(subreaches):
+            outflow = np.empty_like(flow)
+            previous_in = previous_out = flow[0]
+            outflow[0] = previous_out
+            for i, current_in in enumerate(flow[1:].tolist(), start=1):
+                previous_out = c0 * current_in + c1 * previous_in + c2 * previous_out
+                previous_in = current_in
+                outflow[i] = previous_out
+            flow = outflow
+        return _trim_tail(flow)
+
+
+@dataclass(frozen=True)
+class Lag:
+    """Pure translation of the inflow hydrograph by lag_hours"""
+    lag_hours: float
+
+    def route(self, inflow, dt):
+        """Shift an inflow hydrograph by the lag (rounded to whole time steps)"""
+        return np.concatenate([np.zeros(int(round(self.lag_hours / dt))), inflow])
+
+
+@dataclass(frozen=True)
+class Subbasin:
+    """
+    Subbasin producing an NRCS dimensionless unit hydrograph
+
+    watershed: WatershedParameters (its time interval is replaced by the network's)
+    peak_flow_cfs: Peak flow scaling the DUH, or
+    precip_in: Tuple of incremental rainfall depths per time step for a storm hydrograph
+    duration: Duration multiple of Tp
+    """
+    watershed: WatershedParameters
+    peak_flow_cfs: float = None
+    precip_in: tuple = None
+    duration: float = 5
+
+
+@dataclass(frozen=True)
+class Reach:
+    """Reach routing the sum of its inflows"""
+    routing: object
+
+
+@dataclass(frozen=True)
+class Junction:
+    """Junction summing its inflows"""
+    pass
+
+
+def _trim_tail(flow):
+    """Drop trailing values below TAIL_TOLERANCE times the peak"""
+    significant = np.flatnonzero(flow > TAIL_TOLERANCE * flow.max()) if len(flow) else []
+    return flow[:significant[-1] + 1] if len(significant) else flow[:1]
+
+
+def _sum_flows(flows):
+    """Sum hydrographs of different lengths on a shared time grid"""
+    total = np.zeros(max((len(flow) for flow in flows), default=0))
+    for flow in flows:
+        total[:len(flow)] += flow
+    return total
+
+
+class Network:
+    """
+    Basin/reach/junction network with cached, concurrent computation
+
+    Args:
+        time_interval: Time interval of every hydrograph in minutes
+        max_cache_entries: Computed hydrographs kept for reuse between runs (least
+            recently used are evicted first)
+    """
+
+    def __init__(self, time_interval=5.0, max_cache_entries=1024):
+        self.time_interval = time_interval
+        self.dt = time_interval / 60.0
+        self.elements = {}
+        self.downstream = {}
+        self.max_cache_entries = max_cache_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.last_run = {'computed': 0, 'cached': 0}
+
+    def add(self, element_id, element, downstream=None):
+        """
+        Add or replace an element
+
+        Replacing an element keeps its connections unless downstream is given.
+
+        Args:
+            element_id: Unique identifier
+            element: Subbasin, Reach or Junction
+            downstream: Identifier of the element this one flows into (None for an outlet)
+        """
+        if not isinstance(element, (Subbasin, Reach, Junction)):
+            raise TypeError("Elements must be Subbasin, Reach or Junction instances.")
+        if downstream is not None or element_id not in self.elements:
+            self.downstream[element_id] = downstream
+        self.elements[element_id] = element
+
+    def update(self, element_id, **changes):
+        """
+        Replace fields of an element, e.g. update("A", peak_flow_cfs=1500)
+
+        Watershed fields of a subbasin can be given directly (update("A", cn=78)).
+        """
+        element = self.elements[element_id]
+        if isinstance(element, Subbasin):
+            watershed_changes = {key: changes.pop(key) for key in list(changes)
+                                 if key in WatershedParameters.__dataclass_fields__}
+            if watershed_changes:
+                changes['watershed'] = replace(element.watershed, **watershed_changes)
+        self.elements[element_id] = replace(element, **changes)
+
+    def inflows(self):
+        """Return {element id: [ids of elements flowing into it]}"""
+        inflows = {element_id: [] for element_id in self.elements}
+        for element_id, target in self.downstream.items():
+            if target is not None:
+                if target not in self.elements:
+                    raise ValueError(f"Element '{element_id}' flows into unknown element '{target}'.")
+                inflows[target].append(element_id)
+        return inflows
+
+    def topological_order(self):
+        """Return element ids ordered so every element follows its inflows"""
+        inflows = self.inflows()
+        remaining = {element_id: len(sources) for element_id, sources in inflows.items()}
+        ready = [element_id for element_id, count in remaining.items() if count == 0]
+        order = []
+        while ready:
+            element_id = ready.pop()
+            order.append(element_id)
+            target = self.downstream.get(element_id)
+            if target is not None:
+                remaining[target] -= 1
+                if remaining[target] == 0:
+                    ready.append(target)
+        if len(order) != len(self.elements):
+            raise ValueError("The network contains a cycle.")
+        return order
+
+    def _validate(self, inflows):
+        """Check that subbasins are headwaters and routing elements have inflows"""
+        for element_id, element in self.elements.items():
+            if isinstance(element, Subbasin):
+                if inflows[element_id]:
+                    raise ValueError(f"Subbasin '{element_id}' cannot have inflows; add a junction.")
+                if (element.peak_flow_cfs is None) == (element.precip_in is None):
+                    raise ValueError(f"Subbasin '{element_id}' needs either peak_flow_cfs or precip_in.")
+            elif not inflows[element_id]:
+                raise ValueError(f"{type(element).__name__} '{element_id}' has no inflows.")
+
+    def _keys(self, order, inflows):
+        """
+        Cache key per element: its specification plus the keys of its inflows
+
+        Keys are the nested tuples themselves (not their hashes), so two
+        different subtrees can never share a cached hydrograph.
+        """
+        keys = {}
+        for element_id in order:
+            keys[element_id] = (self.elements[element_id], self.dt,
+                                tuple(sorted((keys[source] for source in inflows[element_id]), key=hash)))
+        return keys
+
+    def _compute_element(self, element, inflow_flows):
+        """Hydrograph of one element given its inflow hydrographs"""
+        if isinstance(element, Subbasin):
+            with stage("network.subbasin"):
+                watershed = replace(element.watershed, time_interval=self.time_interval)
+                params = time_parameters(watershed)
+                if element.precip_in is not None:
+                    _, _, flow_cfs = generate_storm_hydrograph(watershed, np.asarray(element.precip_in, dtype=float),
+                                                               params, element.duration)
+                else:
+                    _, _, flow_cfs = generate_hydrograph(params, element.peak_flow_cfs, element.duration)
+                return np.array(flow_cfs)
+        total = _sum_flows(inflow_flows)
+        if isinstance(element, Reach):
+            with stage("network.reach"):
+                return element.routing.route(total, self.dt)
+        return total
+
+    def compute(self, workers=None):
+        """
+        Compute the hydrograph of every element
+
+        Elements whose specification and upstream subtree are unchanged since
+        an earlier run are taken from the cache. Elements whose inflows are
+        ready run concurrently.
+
+        Args:
+            workers: Thread pool size (default: Python's ThreadPoolExecutor default)
+
+        Returns:
+            Dictionary {element id: read-only flow array in CFS}; the time of
+            sample i is i * self.dt hours
+        """
+        order = self.topological_order()
+        inflows = self.inflows()
+        self._validate(inflows)
+        keys = self._keys(order, inflows)
+        results = {}
+        self.last_run = {'computed': 0, 'cached': 0}
+
+        # Cached elements are resolved up front; the rest wait for their inflows
+        pending_inputs = {}
+        for element_id in order:
+            with self._lock:
+                cached = self._cache.get(keys[element_id])
+                if cached is not None:
+                    self._cache.move_to_end(keys[element_id])
+            if cached is not None:
+                results[element_id] = cached
+                self.last_run['cached'] += 1
+            else:
+                pending_inputs[element_id] = sum(1 for source in inflows[element_id] if source not in results)
+
+        def finish(element_id, flow):
+            # Store a read-only result and cache it under the element's key
+            flow.setflags(write=False)
+            results[element_id] = flow
+            self.last_run['computed'] += 1
+            with self._lock:
+                # Evict the least recently used entry
+                if len(self._cache) >= self.max_cache_entries:
+                    self._cache.popitem(last=False)
+                self._cache[keys[element_id]] = flow
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            running = {}
+
+            def submit_ready():
+                for element_id in [e for e, count in pending_inputs.items() if count == 0]:
+                    del pending_inputs[element_id]
+                    sources = [results[source] for source in inflows[element_id]]
+                    running[executor.submit(self._compute_element, self.elements[element_id], sources)] = element_id
+
+            submit_ready()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    element_id = running.pop(future)
+                    finish(element_id, future.result())
+                    target = self.downstream.get(element_id)
+                    if target in pending_inputs:
+                        pending_inputs[target] -= 1
+                submit_ready()
+
+        return results
+
+    def time_hours(self, flow):
+        """Time axis in hours for a computed flow array"""
+        return np.arange(len(flow)) * self.dt
+
+    def clear_cache(self):
+        """Forget all cached hydrographs"""
+        with self._lock:
+            self._cache.clear()
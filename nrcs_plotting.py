@@ -0,0 +1,93 @@
+"""
+Plot decimation for long hydrographs.
+
+Largest-Triangle-Three-Buckets (LTTB) downsampling keeps the points that
+define the visual shape of a series (peaks and changes of slope) while
+capping the number of points sent to the browser. Hydrographs that share a
+dimensionless shape are scalar multiples of the same Q/Qp curve, so the
+indices chosen for the ordinates apply to every AEP trace.
+"""
+
+import numpy as np
+
+# Points per trace sent to the browser (about one per horizontal pixel)
+DEFAULT_MAX_POINTS = 2000
+
+# Total points across all traces above which WebGL traces are used
+WEBGL_THRESHOLD = 5000
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Select indices of a series with Largest-Triangle-Three-Buckets
+
+    The first point, last point and global maximum are always kept.
+
+    Args:
+        x: Array of x values (increasing)
+        y: Array of y values
+        n_out: Target number of points
+
+    Returns:
+        Sorted array of selected indices
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # Interior points split into n_out - 2 buckets
+    edges = (np.floor(np.arange(n_out - 1) * (n - 2) / (n_out - 2)) + 1).astype(np.int64)
+    edges[-1] = n - 1
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+
+        # Average of the next bucket (the last point for the final bucket)
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        # Keep the point forming the largest triangle with the previous pick and the next average
+        area = np.abs((x[previous] - avg_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (avg_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+
+    return np.union1d(selected, [int(np.argmax(y))])
+
+
+def decimate_window(x, y, max_points=DEFAULT_MAX_POINTS, x_range=None):
+    """
+    Indices to plot for a series, optionally restricted to an x window
+
+    Inside a zoomed window the point budget is spent on the visible part
+    only, so zooming in far enough returns every sample.
+
+    Args:
+        x: Array of x values (increasing)
+        y: Array of y values
+        max_points: Maximum number of points to return
+        x_range: Optional (x_min, x_max) window
+
+    Returns:
+        Sorted array of selected indices into x and y
+    """
+    if x_range is None:
+        offset, stop = 0, len(x)
+    else:
+        # Include one sample beyond each edge so lines reach the window border
+        offset = max(int(np.searchsorted(x, x_range[0], side="left")) - 1, 0)
+        stop = min(int(np.searchsorted(x, x_range[1], side="right")) + 1, len(x))
+
+    return offset + lttb_indices(x[offset:stop], y[offset:stop], max_points)
+
+
+def use_webgl(n_points, n_traces, threshold=WEBGL_THRESHOLD):
+    """Whether the total number of plotted points calls for WebGL traces"""
+    return n_points * n_traces > threshold
@@ -0,0 +1,533 @@
+"""
+NRCS Hydrograph Generator HTTP Service
+
+Headless ASGI service exposing the hydrograph generator to other programs.
+Hydrograph computation and response serialization run on a worker process
+pool, off the event loop, so many requests can be served concurrently. Batch
+responses are streamed chunk by chunk in request order, with at most two
+chunks per worker in flight.
+
+Endpoints:
+    GET  /health       Liveness check
+    GET  /metrics      Instrumentation totals in the Prometheus text format
+    POST /hydrograph   One watershed, several AEPs (JSON, or Arrow with ?format=arrow)
+    POST /batch        Many watersheds x AEPs (streamed NDJSON, or Arrow with ?format=arrow)
+
+A watershed is a JSON object with the columns used by batch_run.py:
+    {"basin_id": "A1", "area_mi2": 2.0, "avg_slope": 2.0, "cn": 80,
+     "peak_flows": {"10": 500, "100": 1500}}
+with optional "S", "method", "time_interval" and "m". A batch request is
+    {"watersheds": [...], "time_interval": 5, "m": 3.7, "duration": 5}
+
+Example:
+    python nrcs_service.py --port 8000 --workers 4
+    uvicorn nrcs_service:app --port 8000
+
+Serving needs an ASGI server such as uvicorn; Arrow responses need pyarrow.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import numpy as np
+import pandas as pd
+
+from batch_run import compute_chunk
+from nrcs_calculator import NRCSHydrographGenerator
+from nrcs_exports import iter_result_chunks, write_arrow_chunks
+from nrcs_instrumentation import enable, stage, to_prometheus
+
+# Largest request body accepted, in bytes
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+# Watersheds per worker task for batch requests
+DEFAULT_CHUNK_SIZE = 500
+
+# Largest number of watersheds accepted in one batch request
+MAX_BATCH_WATERSHEDS = 200000
+
+# Response content types
+JSON_TYPE = "application/json"
+NDJSON_TYPE = "application/x-ndjson"
+ARROW_TYPE = "application/vnd.apache.arrow.stream"
+
+# Arrow IPC end-of-stream marker (continuation token followed by a zero length)
+ARROW_EOS = b"\xff\xff\xff\xff\x00\x00\x00\x00"
+
+
+class RequestError(Exception):
+    """Client error returned to the caller with an HTTP status code"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _import_pyarrow():
+    """Import pyarrow for Arrow responses, as a 501 error when it is missing"""
+    try:
+        import pyarrow
+    except ImportError:
+        raise RequestError(501, "Arrow responses require pyarrow. Try installing it with: pip install pyarrow")
+    return pyarrow
+
+
+def _number(spec, key, required=True, positive=True):
+    """Read a numeric field from a watershed object"""
+    value = spec.get(key)
+    if value is None:
+        if required:
+            raise RequestError(400, f"Missing field '{key}'")
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise RequestError(400, f"Field '{key}' must be a number")
+    if positive and not value > 0:
+        raise RequestError(400, f"Field '{key}' must be positive")
+    return float(value)
+
+
+def parse_watershed(spec):
+    """
+    Validate one watershed object from a request
+
+    Args:
+        spec: Dictionary decoded from the request JSON
+
+    Returns:
+        Dictionary with float inputs, the calculation method and a
+        {aep: peak flow in CFS} dictionary with integer AEP keys
+    """
+    if not isinstance(spec, dict):
+        raise RequestError(400, "Each watershed must be a JSON object")
+
+    watershed = {
+        'basin_id': spec.get('basin_id'),
+        'area_mi2': _number(spec, 'area_mi2'),
+        'avg_slope': _number(spec, 'avg_slope'),
+        'cn': _number(spec, 'cn', required=False),
+        'S': _number(spec, 'S', required=False),
+        'time_interval': _number(spec, 'time_interval', required=False),
+        'm': _number(spec, 'm', required=False)
+    }
+
+    # Method defaults to CN when a curve number is given
+    method = str(spec.get('method') or ("CN" if watershed['cn'] is not None else "S")).upper()
+    if method not in ("CN", "S"):
+        raise RequestError(400, "Field 'method' must be 'CN' or 'S'")
+    if watershed['cn' if method == "CN" else 'S'] is None:
+        raise RequestError(400, f"Method {method} needs field '{'cn' if method == 'CN' else 'S'}'")
+    watershed['method'] = method
+
+    # Peak flows keyed by AEP in years
+    peak_flows = spec.get('peak_flows')
+    if not isinstance(peak_flows, dict) or not peak_flows:
+        raise RequestError(400, "Field 'peak_flows' must be an object of {AEP: peak flow in CFS}")
+    watershed['peak_flows'] = {}
+    for aep, peak in peak_flows.items():
+        if not str(aep).isdigit():
+            raise RequestError(400, f"AEP '{aep}' must be a whole number of years")
+        if isinstance(peak, bool) or not isinstance(peak, (int, float)) or peak < 0:
+            raise RequestError(400, f"Peak flow for AEP {aep} must be a non-negative number")
+        watershed['peak_flows'][int(aep)] = float(peak)
+
+    return watershed
+
+
+def compute_single(watershed, duration=5, output_format="json"):
+    """
+    Generate the hydrographs of one watershed and serialize the response
+
+    Runs in a worker process.
+
+    Args:
+        watershed: Dictionary from parse_watershed
+        duration: Duration multiple of Tp
+        output_format: "json" or "arrow"
+
+    Returns:
+        Response body as bytes
+    """
+    generator = NRCSHydrographGenerator()
+    generator.area_mi2 = watershed['area_mi2']
+    generator.avg_slope = watershed['avg_slope']
+    generator.method = watershed['method']
+    if watershed['cn'] is not None:
+        generator.cn = watershed['cn']
+    if watershed['S'] is not None:
+        generator.S = watershed['S']
+    if watershed['time_interval'] is not None:
+        generator.time_interval = watershed['time_interval']
+    if watershed['m'] is not None:
+        generator.m = watershed['m']
+    valid, message = generator.calculate_time_parameters()
+
+    labels = list(watershed['peak_flows'])
+    result = generator.generate_result([watershed['peak_flows'][aep] for aep in labels], labels, duration)
+
+    # Arrow: the wide table of HydrographResult.to_dataframe
+    if output_format == "arrow":
+        buffer = io.BytesIO()
+        write_arrow_chunks(iter_result_chunks(result), buffer)
+        return buffer.getvalue()
+
+    body = {
+        'basin_id': watershed['basin_id'],
+        'parameters': {
+            't_lag_hr': generator.t_lag,
+            'tc_hr': generator.tc,
+            'tr_hr': generator.tr,
+            'Tp_hr': generator.Tp,
+            'valid': valid,
+            'message': message
+        },
+        'time_hr': result.time_hours.tolist(),
+        'flow_cfs': {str(label): result.flow_cfs(label).tolist() for label in labels},
+        'flow_m3s': {str(label): result.flow_m3s(label).tolist() for label in labels}
+    }
+    return json.dumps(body).encode("utf-8")
+
+
+def _watersheds_to_frame(watersheds, time_interval=5.0, m=3.7):
+    """
+    Build a batch_run input table from parsed watersheds
+
+    Basin identifiers are replaced by positions so results can be matched
+    back to the request even when identifiers repeat. Watersheds without
+    their own time_interval or m take the request defaults.
+    """
+    defaults = {'time_interval': time_interval, 'm': m}
+    columns = {
+        'basin_id': np.arange(len(watersheds)),
+        'area_mi2': [w['area_mi2'] for w in watersheds],
+        'avg_slope': [w['avg_slope'] for w in watersheds],
+        'method': [w['method'] for w in watersheds]
+    }
+    for key in ('cn', 'S', 'time_interval', 'm'):
+        values = [w[key] for w in watersheds]
+        if any(value is not None for value in values):
+            default = defaults.get(key, np.nan)
+            columns[key] = np.array([default if value is None else value for value in values], dtype=float)
+
+    frame = pd.DataFrame(columns)
+    aeps = sorted({aep for w in watersheds for aep in w['peak_flows']})
+    for aep in aeps:
+        frame[f"{aep}yr"] = [w['peak_flows'].get(aep, np.nan) for w in watersheds]
+    return frame
+
+
+def _arrow_schema(pa):
+    """Schema of the long-format batch hydrograph table"""
+    return pa.schema([
+        ("basin_id", pa.string()),
+        ("aep", pa.int64()),
+        ("time_hr", pa.float64()),
+        ("flow_cfs", pa.float64()),
+        ("flow_m3s", pa.float64())
+    ])
+
+
+def compute_batch_chunk(watersheds, time_interval=5.0, m=3.7, duration=5, output_format="ndjson"):
+    """
+    Generate the hydrographs of a chunk of watersheds and serialize them
+
+    Runs in a worker process.
+
+    Args:
+        watersheds: List of dictionaries from parse_watershed
+        time_interval: Default time interval in minutes
+        m: Default gamma shape factor
+        duration: Duration multiple of Tp
+        output_format: "ndjson" (one line per watershed) or "arrow" (one record batch)
+
+    Returns:
+        Response body fragment as bytes
+    """
+    params_df, hydrographs_df = compute_chunk(_watersheds_to_frame(watersheds, time_interval, m), time_interval, m, duration)
+    basin_ids = [w['basin_id'] for w in watersheds]
+
+    # Arrow: one record batch of the long table; the stream header is sent separately
+    if output_format == "arrow":
+        import pyarrow as pa
+        if hydrographs_df.empty:
+            return b""
+        hydrographs_df = hydrographs_df.assign(
+            basin_id=[str(basin_ids[i]) for i in hydrographs_df["basin_id"]],
+            aep=hydrographs_df["aep"].astype(np.int64))
+        batch = pa.RecordBatch.from_pandas(hydrographs_df, schema=_arrow_schema(pa), preserve_index=False)
+        return batch.serialize().to_pybytes()
+
+    # Split the long table into runs of one basin and AEP
+    positions = hydrographs_df["basin_id"].to_numpy()
+    aeps = hydrographs_df["aep"].to_numpy()
+    starts = np.flatnonzero(np.r_[True, (positions[1:] != positions[:-1]) | (aeps[1:] != aeps[:-1])])
+    stops = np.r_[starts[1:], len(positions)]
+    time_hr = hydrographs_df["time_hr"].to_numpy()
+    flow_cfs = hydrographs_df["flow_cfs"].to_numpy()
+    flow_m3s = hydrographs_df["flow_m3s"].to_numpy()
+
+    hydrographs = [{} for _ in watersheds]
+    for start, stop in zip(starts, stops):
+        hydrographs[positions[start]][str(aeps[start])] = {
+            'time_hr': time_hr[start:stop].tolist(),
+            'flow_cfs': flow_cfs[start:stop].tolist(),
+            'flow_m3s': flow_m3s[start:stop].tolist()
+        }
+
+    # One JSON line per watershed
+    lines = []
+    for row in params_df.itertuples(index=False):
+        lines.append(json.dumps({
+            'basin_id': basin_ids[row.basin_id],
+            'parameters': {
+                't_lag_hr': row.t_lag_hr,
+                'tc_hr': row.tc_hr,
+                'tr_hr': row.tr_hr,
+                'Tp_hr': row.Tp_hr,
+                'valid': bool(row.valid)
+            },
+            'hydrographs': hydrographs[row.basin_id]
+        }))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class HydrographService:
+    """
+    ASGI application serving NRCS hydrographs
+
+    Args:
+        workers: Worker processes (default: CPU count); 0 runs requests on a
+                 thread pool in the server process instead
+        chunk_size: Watersheds per worker task for batch requests
+        max_body_bytes: Largest request body accepted
+        max_batch_watersheds: Largest number of watersheds per batch request
+    """
+
+    def __init__(self, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, max_body_bytes=MAX_BODY_BYTES,
+                 max_batch_watersheds=MAX_BATCH_WATERSHEDS):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.chunk_size = chunk_size
+        self.max_body_bytes = max_body_bytes
+        self.max_batch_watersheds = max_batch_watersheds
+        self.executor = None
+
+    def start(self):
+        """Create the worker pool (called on ASGI lifespan startup or first use)"""
+        if self.executor is None:
+            if self.workers > 0:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def shutdown(self):
+        """Shut the worker pool down"""
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    async def __call__(self, scope, receive, send):
+        """ASGI entry point"""
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        """Start and stop the worker pool with the server"""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope, receive, send):
+        """Route an HTTP request and turn errors into JSON responses"""
+        routes = {
+            "/health": ("GET", self._health),
+            "/metrics": ("GET", self._metrics),
+            "/hydrograph": ("POST", self._hydrograph),
+            "/batch": ("POST", self._batch)
+        }
+        path = scope["path"].rstrip("/") or "/"
+        started = []
+
+        async def tracked_send(message):
+            # Remember whether response headers went out (errors can then only abort the stream)
+            if message["type"] == "http.response.start":
+                started.append(True)
+            await send(message)
+
+        try:
+            if path not in routes:
+                raise RequestError(404, f"Unknown path '{path}'")
+            method, handler = routes[path]
+            if scope["method"] != method:
+                raise RequestError(405, f"Use {method} for {path}")
+            with stage(f"service{path.replace('/', '.')}"):
+                await handler(scope, receive, tracked_send)
+        except RequestError as e:
+            if started:
+                raise
+            await _respond(send, e.status, json.dumps({'error': str(e)}).encode("utf-8"), JSON_TYPE)
+        except Exception as e:
+            if started:
+                raise
+            await _respond(send, 500, json.dumps({'error': f"{type(e).__name__}: {e}"}).encode("utf-8"), JSON_TYPE)
+
+    async def _read_json(self, receive):
+        """Read and decode the request body, enforcing the size limit"""
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise RequestError(400, "Client disconnected")
+            body += message.get("body", b"")
+            if len(body) > self.max_body_bytes:
+                raise RequestError(413, f"Request body larger than {self.max_body_bytes} bytes")
+            if not message.get("more_body", False):
+                break
+        try:
+            return json.loads(body)
+        except ValueError as e:
+            raise RequestError(400, f"Invalid JSON: {e}")
+
+    async def _run(self, func, *args):
+        """Run a function on the worker pool"""
+        self.start()
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def _health(self, scope, receive, send):
+        """Liveness check"""
+        await _respond(send, 200, b'{"status": "ok"}', JSON_TYPE)
+
+    async def _metrics(self, scope, receive, send):
+        """Instrumentation totals of the server process (calculator stages run in workers are not included)"""
+        await _respond(send, 200, to_prometheus().encode("utf-8"), "text/plain; version=0.0.4")
+
+    async def _hydrograph(self, scope, receive, send):
+        """Hydrographs of one watershed"""
+        output_format = _output_format(scope, ("json", "arrow"))
+        request = await self._read_json(receive)
+        watershed = parse_watershed(request)
+        duration = _number(request, 'duration', required=False) or 5
+        if output_format == "arrow":
+            _import_pyarrow()
+
+        body = await self._run(compute_single, watershed, duration, output_format)
+        await _respond(send, 200, body, ARROW_TYPE if output_format == "arrow" else JSON_TYPE)
+
+    async def _batch(self, scope, receive, send):
+        """Hydrographs of many watersheds, streamed in request order"""
+        output_format = _output_format(scope, ("ndjson", "arrow"))
+        request = await self._read_json(receive)
+        if not isinstance(request, dict) or not isinstance(request.get('watersheds'), list):
+            raise RequestError(400, "Field 'watersheds' must be a list of watershed objects")
+        if len(request['watersheds']) > self.max_batch_watersheds:
+            raise RequestError(413, f"At most {self.max_batch_watersheds} watersheds per batch request")
+        watersheds = [parse_watershed(spec) for spec in request['watersheds']]
+        time_interval = _number(request, 'time_interval', required=False) or 5.0
+        m = _number(request, 'm', required=False) or 3.7
+        duration = _number(request, 'duration', required=False) or 5
+        pa = _import_pyarrow() if output_format == "arrow" else None
+
+        # Keep at most two chunks per worker in flight and send results in order
+        self.start()
+        loop = asyncio.get_running_loop()
+        max_in_flight = 2 * max(self.workers, 1)
+        starts = deque(range(0, len(watersheds), self.chunk_size))
+        pending = deque()
+
+        def submit():
+            while starts and len(pending) < max_in_flight:
+                start = starts.popleft()
+                pending.append(loop.run_in_executor(
+                    self.executor, compute_batch_chunk, watersheds[start:start + self.chunk_size],
+                    time_interval, m, duration, output_format))
+
+        try:
+            # The first chunk finishes before the headers go out, so its errors get a proper error response
+            submit()
+            body = await pending.popleft() if pending else b""
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", (ARROW_TYPE if pa else NDJSON_TYPE).encode())]
+            })
+            if pa is not None:
+                body = _arrow_schema(pa).serialize().to_pybytes() + body
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+
+            while pending:
+                body = await pending.popleft()
+                submit()
+                await send({"type": "http.response.body", "body": body, "more_body": True})
+        finally:
+            # Drop queued work if the client went away or a chunk failed
+            for future in pending:
+                future.cancel()
+
+        await send({"type": "http.response.body", "body": ARROW_EOS if pa else b""})
+
+
+def _output_format(scope, choices):
+    """Response format from the ?format= query parameter (first choice by default)"""
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    output_format = query.get("format", [choices[0]])[0].lower()
+    if output_format not in choices:
+        raise RequestError(400, f"Invalid format '{output_format}'. Use one of: {', '.join(choices)}")
+    return output_format
+
+
+async def _respond(send, status, body, content_type):
+    """Send a complete response"""
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+# Default application for "uvicorn nrcs_service:app"
+app = HydrographService()
+
+
+def main(argv=None):
+    """Parse command-line arguments and serve the application with uvicorn"""
+    parser = argparse.ArgumentParser(description="Serve NRCS dimensionless unit hydrographs over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on (default: 8000)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes for hydrograph computation (default: CPU count; 0 = thread in server)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"Watersheds per worker task for batch requests (default: {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument("--metrics", action="store_true",
+                        help="Collect stage timings for /metrics (server process only; calculator stages "
+                             "are included only with --workers 0)")
+    args = parser.parse_args(argv)
+
+    try:
+        import uvicorn
+    except ImportError:
+        print("Serving requires uvicorn. Try installing it with: pip install uvicorn")
+        return 1
+
+    if args.metrics:
+        enable()
+    service = HydrographService(workers=args.workers, chunk_size=args.chunk_size)
+    uvicorn.run(service, host=args.host, port=args.port, log_level="info")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""
+Parameter sweeps and precomputed time parameter lookup tables.
+
+sweep() evaluates the lag, tc, tr and Tp equations over an N-D grid of
+watershed parameters (any of area, slope and CN or S) in one broadcast
+computation, with the NRCS validity flag for every grid cell.
+
+TpLookupTable stores the time lag of such a grid on disk (.npy data plus a
+.json file describing the axes) and is opened memory-mapped, so many
+processes can share one table and a query only reads the grid cells it
+touches. Queries use multilinear interpolation in log coordinates, which is
+exact along the area and slope axes (the lag equation is a power law in
+both); tc, tr and Tp follow from the interpolated time lag.
+"""
+
+import itertools
+import json
+
+import numpy as np
+
+from nrcs_calculator import WatershedParameters, calculate_time_parameters_batch, time_parameters_from_tlag
+
+# Parameters that can be swept
+SWEEP_AXES = ("area_mi2", "avg_slope", "cn", "S")
+
+
+def sweep(watershed=None, time_interval=None, **axes):
+    """
+    Evaluate the time parameters over a grid of watershed parameters
+
+    Usage:
+        surface = sweep(area_mi2=np.linspace(1, 100, 50), avg_slope=[1, 2, 5], cn=np.arange(50, 99))
+        surface['Tp'].shape  # (50, 3, 49)
+
+    Args:
+        watershed: WatershedParameters with the values of parameters that are
+            not swept (default: WatershedParameters())
+        time_interval: Time interval in minutes (default: the watershed's)
+        **axes: Parameter name -> 1-D array of values, in grid axis order
+            ("area_mi2", "avg_slope", and "cn" or "S")
+
+    Returns:
+        Dictionary with 'axes' ({name: values}), 'method' and N-D arrays
+        't_lag', 'tc', 'tr', 'Tp', 'dt' and 'valid' of shape (len(axis), ...)
+    """
+    watershed = watershed or WatershedParameters()
+    unknown = set(axes) - set(SWEEP_AXES)
+    if unknown:
+        raise ValueError(f"Cannot sweep {sorted(unknown)}. Choose from {', '.join(SWEEP_AXES)}.")
+    if "cn" in axes and "S" in axes:
+        raise ValueError("Sweep either 'cn' or 'S', not both.")
+    method = "S" if "S" in axes else "CN" if "cn" in axes else watershed.method
+
+    # Reshape each axis so the inputs broadcast to the full grid
+    axes = {name: np.asarray(values, dtype=float).ravel() for name, values in axes.items()}
+    grid = {}
+    for i, (name, values) in enumerate(axes.items()):
+        shape = [1] * len(axes)
+        shape[i] = len(values)
+        grid[name] = values.reshape(shape)
+
+    params = calculate_time_parameters_batch(
+        grid.get('area_mi2', watershed.area_mi2),
+        grid.get('avg_slope', watershed.avg_slope),
+        watershed.time_interval if time_interval is None else time_interval,
+        cn=grid.get('cn', watershed.cn),
+        S=grid.get('S', watershed.S),
+        method=method
+    )
+    full_shape = tuple(len(values) for values in axes.values())
+    result = {key: np.broadcast_to(value, full_shape) for key, value in params.items()}
+    result['axes'] = axes
+    result['method'] = method
+    return result
+
+
+class TpLookupTable:
+    """
+    Precomputed time lag grid with multilinear interpolation
+
+    Args:
+        axes: Dictionary of axis name -> increasing 1-D values (at least 2 each)
+        t_lag: Time lag grid in hours, shape (len(axis), ...); natural log
+            of the time lag when log is True
+        valid: NRCS validity flag grid of the same shape
+        method: "CN" or "S"
+        fixed: Values of the watershed parameters that are not axes
+        log: Interpolate log(t_lag) against log(axis values)
+    """
+
+    def __init__(self, axes, t_lag, valid, method, fixed, log=True):
+        self.axes = {name: np.asarray(values, dtype=float) for name, values in axes.items()}
+        self.t_lag = t_lag
+        self.valid = valid
+        self.method = method
+        self.fixed = dict(fixed)
+        self.log = log
+        for name, values in self.axes.items():
+            if len(values) < 2 or np.any(np.diff(values) <= 0):
+                raise ValueError(f"Axis '{name}' needs at least 2 increasing values.")
+
+    @classmethod
+    def build(cls, watershed=None, dtype=np.float32, log=True, **axes):
+        """
+        Sweep a grid and build a table from it
+
+        Args:
+            watershed: WatershedParameters with the values of parameters that are not axes
+            dtype: Storage dtype of the time lag grid (float32 halves the file size)
+            log: Interpolate in log coordinates
+            **axes: Axes as in sweep()
+        """
+        watershed = watershed or WatershedParameters()
+        surface = sweep(watershed, **axes)
+        fixed = {name: getattr(watershed, name) for name in SWEEP_AXES
+                 if name not in surface['axes'] and (name != "cn" or surface['method'] == "CN")
+                 and (name != "S" or surface['method'] == "S")}
+        t_lag = np.log(surface['t_lag']) if log else surface['t_lag']
+        return cls(surface['axes'], np.ascontiguousarray(t_lag, dtype=dtype),
+                   np.ascontiguousarray(surface['valid'], dtype=np.uint8), surface['method'], fixed, log)
+
+    def save(self, path):
+        """
+        Write the table as path.npy (time lag grid), path.valid.npy and path.json (axes)
+
+        Args:
+            path: Output path without extension
+        """
+        np.save(path + ".npy", np.asarray(self.t_lag))
+        np.save(path + ".valid.npy", np.asarray(self.valid, dtype=np.uint8))
+        with open(path + ".json", "w") as f:
+            json.dump({
+                'axes': {name: values.tolist() for name, values in self.axes.items()},
+                'method': self.method,
+                'fixed': self.fixed,
+                'log': self.log
+            }, f, indent=2)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Open a saved table
+
+        Args:
+            path: Path given to save()
+            mmap: Memory-map the grids instead of reading them into memory
+        """
+        with open(path + ".json") as f:
+            meta = json.load(f)
+        mode = "r" if mmap else None
+        return cls(meta['axes'], np.load(path + ".npy", mmap_mode=mode), np.load(path + ".valid.npy", mmap_mode=mode),
+                   meta['method'], meta['fixed'], meta['log'])
+
+    @property
+    def nbytes(self):
+        """Size of the stored grids in bytes"""
+        return self.t_lag.nbytes + self.valid.nbytes
+
+    def lookup(self, **query):
+        """
+        Interpolate time parameters at arbitrary points
+
+        Args:
+            **query: One array (or scalar) per table axis; arrays broadcast together
+
+        Returns:
+            Dictionary with 't_lag', 'tc', 'tr', 'Tp' (NaN outside the grid),
+            'valid' (False when any surrounding grid cell fails the validity
+            check) and 'in_range'
+        """
+        missing = set(self.axes) - set(query)
+        if missing:
+            raise ValueError(f"Missing query values for {sorted(missing)}.")
+        coords = np.broadcast_arrays(*[np.asarray(query[name], dtype=float) for name in self.axes])
+
+        # Flat index of each cell's lower corner and fractional position along each axis
+        shape = coords[0].shape
+        base = np.zeros(shape, dtype=np.int64)
+        fractions = []
+        in_range = np.ones(shape, dtype=bool)
+        strides = np.cumprod((self.t_lag.shape + (1,))[:0:-1])[::-1]
+        for values, x, stride in zip(self.axes.values(), coords, strides):
+            in_range &= (x >= values[0]) & (x <= values[-1])
+            if self.log:
+                values, x = np.log(values), np.log(np.where(x > 0, x, np.nan))
+            i = np.clip(np.searchsorted(values, x, side="right") - 1, 0, len(values) - 2)
+            base += i * stride
+            fractions.append((x - values[i]) / (values[i + 1] - values[i]))
+        base[~in_range] = 0
+
+        # Weighted sum over the 2^d corners of each cell (only these cells are read)
+        grid = self.t_lag.reshape(-1)
+        flags = self.valid.reshape(-1)
+        total = np.zeros(shape)
+        valid = np.ones(shape, dtype=bool)
+        for corner in itertools.product((0, 1), repeat=len(self.axes)):
+            weight = np.ones(shape)
+            for offset, fraction in zip(corner, fractions):
+                weight *= fraction if offset else 1 - fraction
+            cell = base + int(np.dot(corner, strides))
+            total += weight * grid[cell]
+            valid &= flags[cell].astype(bool)
+
+        t_lag = np.where(in_range, np.exp(total) if self.log else total, np.nan)
+        params = time_parameters_from_tlag(t_lag)
+        del params['dt']
+        params['valid'] = valid & in_range
+        params['in_range'] = in_range
+        return params
+
+    def time_parameters_batch(self, area_mi2, avg_slope, time_interval=5.0, cn=None, S=None, method="CN"):
+        """
+        Drop-in replacement for calculate_time_parameters_batch backed by the table
+
+        Watersheds the table cannot answer (outside the grid, a different
+        method, or a non-axis parameter that differs from the table's fixed
+        value) are calculated directly.
+        """
+        inputs = {'area_mi2': area_mi2, 'avg_slope': avg_slope, 'cn': cn, 'S': S}
+        n = len(np.atleast_1d(area_mi2))
+        usable = np.broadcast_to(np.asarray(method) == self.method, (n,)).copy()
+        for name, value in self.fixed.items():
+            usable &= np.broadcast_to(np.isclose(np.asarray(inputs[name], dtype=float), value), (n,))
+
+        query = {name: np.broadcast_to(np.asarray(inputs[name], dtype=float), (n,)) for name in self.axes}
+        params = self.lookup(**query)
+        usable &= params['in_range']
+        params = time_parameters_from_tlag(np.where(usable, params['t_lag'], np.nan), time_interval)
+
+        # Direct calculation for the rest
+        if not usable.all():
+            rest = ~usable
+            pick = lambda value: None if value is None else (
+                value[rest] if np.ndim(value) and np.shape(value)[0] == n else value)
+            direct = calculate_time_parameters_batch(pick(area_mi2), pick(avg_slope), pick(time_interval),
+                                                     cn=pick(cn), S=pick(S), method=pick(method))
+            for key in params:
+                params[key][rest] = direct[key]
+        return params
@@ -3,21 +3,36 @@ NRCS Hydrograph Generator Launcher
 
 This script automatically launches the NRCS Hydrograph Generator Streamlit app
 with the correct port settings to avoid permission issues.
+
+The browser is opened as soon as the server answers its health check, and an
+instance already started by this launcher is reused instead of starting a
+second server (pass --new to always start one).
 """
 
+import argparse
+import collections
+import json
 import os
 import sys
 import subprocess
+import tempfile
+import threading
+import urllib.request
 import webbrowser
 import time
-import platform
 import socket
 
+# Where the launcher records the instance it started, for reuse by later launches
+STATE_FILE = os.path.join(tempfile.gettempdir(), "nrcs_duh_launcher.json")
+
+# Streamlit's readiness endpoint
+HEALTH_PATH = "/_stcore/health"
+
 def find_available_port(start_port=8501, max_attempts=10):
     """Find an available port starting from start_port"""
     current_port = start_port
     attempts = 0
-    
+
     while attempts < max_attempts:
         try:
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
@@ -26,83 +41,208 @@ def find_available_port(start_port=8501, max_attempts=10):
         except OSError:
             current_port += 1
             attempts += 1
-    
+
     # If we couldn't find an available port in the range, return a default
     return 8888
 
-def run_streamlit_app():
-    """Run the Streamlit app with appropriate settings"""
+def is_healthy(port, timeout=1.0):
+    """Return True if a Streamlit server on the port answers its health check"""
+    try:
+        with urllib.request.urlopen(f"http://localhost:{port}{HEALTH_PATH}", timeout=timeout) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+def wait_until_ready(port, process, timeout=60.0, interval=0.1):
+    """
+    Poll the health endpoint until the server is ready
+
+    Args:
+        port: Server port
+        process: Server process (polling stops early if it exits)
+        timeout: Maximum wait in seconds
+        interval: Initial delay between polls in seconds (doubles up to 0.5 s)
+
+    Returns:
+        True when the server is ready, False if it exited or timed out
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        if is_healthy(port):
+            return True
+        time.sleep(interval)
+        interval = min(interval * 2, 0.5)
+    return False
+
+def drain_output(stream, lines, echo=True):
+    """
+    Read server output on a background thread so a full pipe never blocks the server
+
+    Args:
+        stream: Process output stream
+        lines: Deque receiving the most recent lines (for error reports)
+        echo: Print each line to the console
+
+    Returns:
+        The started daemon thread
+    """
+    def drain():
+        for raw_line in iter(stream.readline, b""):
+            line = raw_line.decode("utf-8", errors="replace").rstrip()
+            lines.append(line)
+            if echo:
+                print(f"  [streamlit] {line}")
+        stream.close()
+
+    thread = threading.Thread(target=drain, name="streamlit-output", daemon=True)
+    thread.start()
+    return thread
+
+def find_running_instance(app_path):
+    """Return the port of a healthy instance this launcher started for app_path, or None"""
+    try:
+        with open(STATE_FILE) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get("app_path") == app_path and is_healthy(state.get("port")):
+        return state["port"]
+    return None
+
+def record_instance(app_path, port, pid):
+    """Remember the instance started by this launcher"""
+    try:
+        with open(STATE_FILE, "w") as f:
+            json.dump({"app_path": app_path, "port": port, "pid": pid}, f)
+    except OSError:
+        pass
+
+def forget_instance(pid):
+    """Remove the recorded instance if it is the given process"""
+    try:
+        with open(STATE_FILE) as f:
+            if json.load(f).get("pid") == pid:
+                os.remove(STATE_FILE)
+    except (OSError, ValueError):
+        pass
+
+def open_browser(port):
+    """Open the app in the default browser"""
+    url = f"http://localhost:{port}"
+    print(f"Opening {url} in your default browser...")
+    webbrowser.open(url)
+
+def run_streamlit_app(port=None, reuse=True, timeout=60.0, quiet=False, open_in_browser=True):
+    """
+    Run the Streamlit app with appropriate settings
+
+    Args:
+        port: Server port (default: first free port from 8501)
+        reuse: Open an instance already started by this launcher instead of starting another
+        timeout: Seconds to wait for the server to become ready
+        quiet: Do not echo the server's log output
+        open_in_browser: Open the app in the default browser once it is ready
+    """
     # Find the directory where this script is located
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    
+
     # Path to the Streamlit app
     app_path = os.path.join(script_dir, "streamlit_app.py")
-    
+
     # Check if the app file exists
     if not os.path.exists(app_path):
         print(f"Error: Could not find the Streamlit app at {app_path}")
         print("Make sure 'streamlit_app.py' is in the same directory as this launcher.")
         input("Press Enter to exit...")
         sys.exit(1)
-    
+
+    # Reuse a running instance if there is one
+    if reuse:
+        running_port = find_running_instance(app_path)
+        if running_port is not None:
+            print(f"NRCS Hydrograph Generator is already running on port {running_port}.")
+            if open_in_browser:
+                open_browser(running_port)
+            return
+
     # Find an available port
-    port = find_available_port()
+    port = port or find_available_port()
     print(f"Launching NRCS Hydrograph Generator on port {port}...")
-    
-    # Command to run the Streamlit app
+
+    # Command to run the Streamlit app (with this interpreter, so the right environment is used)
     cmd = [
-        "streamlit", "run", app_path,
+        sys.executable, "-m", "streamlit", "run", app_path,
         "--server.port", str(port),
         "--server.address", "localhost",
         "--server.headless", "true"  # Don't automatically open browser
     ]
-    
+
+    process = None
     try:
-        # Start the Streamlit process
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        
-        # Give it a moment to start
-        time.sleep(2)
-        
-        # Check if the process is still running
-        if process.poll() is None:
-            # Process is running, now open browser
-            url = f"http://localhost:{port}"
-            print(f"Opening {url} in your default browser...")
-            webbrowser.open(url)
-            
+        # Start the Streamlit process; its output is drained in the background
+        start_time = time.monotonic()
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        recent_lines = collections.deque(maxlen=50)
+        output_thread = drain_output(process.stdout, recent_lines, echo=not quiet)
+
+        # Wait until the server answers its health check
+        if wait_until_ready(port, process, timeout):
+            print(f"Server ready after {time.monotonic() - start_time:.1f} s.")
+            record_instance(app_path, port, process.pid)
+            if open_in_browser:
+                open_browser(port)
+
             print("\nNRCS Hydrograph Generator is running!")
             print("Close this window or press Ctrl+C to stop the application.")
-            
+
             # Keep the process running until user interrupts
             process.wait()
+            forget_instance(process.pid)
         else:
-            # Process failed to start, get error output
-            stdout, stderr = process.communicate()
+            # Process failed to start (or never became ready), show its recent output
+            if process.poll() is None:
+                print(f"Error: Streamlit did not become ready within {timeout:g} seconds.")
+                process.terminate()
+            process.wait()
+            output_thread.join(timeout=2)
+            output = "\n".join(recent_lines)
             print("Error starting Streamlit app:")
-            print(stderr.decode('utf-8'))
-            
+            print(output)
+
             # Check if streamlit is installed
-            if "No such file or directory" in stderr.decode('utf-8') or "not recognized" in stderr.decode('utf-8'):
+            if "No module named streamlit" in output:
                 print("\nIt looks like Streamlit might not be installed.")
                 print("Try installing it with: pip install streamlit")
-            
+
             input("Press Enter to exit...")
-    
+
     except KeyboardInterrupt:
         # Handle Ctrl+C gracefully
         print("\nShutting down NRCS Hydrograph Generator...")
-        process.terminate()
-    
+        if process is not None:
+            process.terminate()
+            forget_instance(process.pid)
+
     except Exception as e:
         print(f"An error occurred: {str(e)}")
         input("Press Enter to exit...")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Launch the NRCS Hydrograph Generator.")
+    parser.add_argument("--port", type=int, default=None, help="Server port (default: first free port from 8501)")
+    parser.add_argument("--new", action="store_true", help="Start a new server even if one is already running")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for the server (default: 60)")
+    parser.add_argument("--quiet", action="store_true", help="Do not show the server's log output")
+    parser.add_argument("--no-browser", action="store_true", help="Do not open a browser")
+    args = parser.parse_args()
+
     # Print welcome message
     print("=" * 60)
     print("NRCS Dimensionless Unit Hydrograph Generator Launcher")
     print("=" * 60)
-    
+
     # Run the app
-    run_streamlit_app()
+    run_streamlit_app(args.port, reuse=not args.new, timeout=args.timeout, quiet=args.quiet,
+                      open_in_browser=not args.no_browser)
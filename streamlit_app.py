@@ -1,22 +1,137 @@
 import streamlit as st
-import pandas as pd
 import numpy as np
-import plotly.graph_objects as go
-import base64
-import io
 from datetime import datetime
+import contextlib
 import os
-import sys
+import tempfile
 
 # Import the NRCS calculator from the same directory
-from nrcs_calculator import NRCSHydrographGenerator
+from nrcs_calculator import ORDINATE_CACHE, HydrographResult, WatershedParameters, time_parameters
+from nrcs_instrumentation import run_timings, stage
+from nrcs_exports import EXPORT_FORMATS, available_formats, export_result
+from nrcs_plotting import DEFAULT_MAX_POINTS, decimate_window, use_webgl
 
-def generate_csv_download_link(df, filename):
-    """Generate a link to download the dataframe as a CSV file"""
-    csv = df.to_csv(index=False)
-    b64 = base64.b64encode(csv.encode()).decode()
-    href = f'<a href="data:file/csv;base64,{b64}" download="{filename}">Download CSV File</a>'
-    return href
+@st.cache_data(show_spinner=False)
+def calculate_time_parameters_cached(area, avg_slope, time_interval, m_value, calc_method, cn, s_value):
+    """Calculate time parameters, cached on the watershed inputs"""
+    # Immutable watershed inputs, with the method-specific parameter
+    if calc_method == "CN":
+        watershed = WatershedParameters(area, avg_slope, cn=cn, method="CN", time_interval=time_interval, m=m_value)
+    else:  # S method
+        watershed = WatershedParameters(area, avg_slope, S=s_value, method="S", time_interval=time_interval, m=m_value)
+    
+    # Calculate time parameters
+    params = time_parameters(watershed)
+    
+    return {
+        'shape': (params.m, params.dt, params.Tp),
+        'valid': params.valid,
+        'message': params.message,
+        'parameters': params.as_table()
+    }
+
+@st.cache_data(show_spinner=False)
+def dimensionless_curve(m, dt, Tp, duration=5):
+    """Time grid and Q/Qp ordinates, cached on the hydrograph shape"""
+    flow_ratio = ORDINATE_CACHE.get(m, dt / Tp, duration)
+    return np.arange(len(flow_ratio)) * dt, flow_ratio
+
+@st.cache_resource(show_spinner=False, max_entries=100)
+def build_hydrograph_result(shape, peak_flows):
+    """
+    Compact hydrograph result (one ordinate vector plus peak flows)
+    
+    Shared read-only across reruns and sessions; callers must not modify it.
+    
+    Args:
+        shape: (m, dt, Tp) tuple
+        peak_flows: Tuple of (AEP, peak flow in CFS) pairs
+    """
+    time_hours, flow_ratio = dimensionless_curve(*shape)
+    aeps = [aep for aep, _ in peak_flows]
+    peaks_cfs = [peak_flow_cfs for _, peak_flow_cfs in peak_flows]
+    return HydrographResult(time_hours, flow_ratio, peaks_cfs, aeps)
+
+@st.cache_resource(show_spinner=False, max_entries=20)
+def build_table_view(shape, peak_flows, units):
+    """Hydrograph table for the selected display units, built lazily from the compact result"""
+    return build_hydrograph_result(shape, peak_flows).to_dataframe(units)
+
+@st.cache_resource(show_spinner=False, max_entries=100)
+def build_hydrograph_figure(shape, peak_flows, display_units, x_range=None):
+    """
+    Build the Plotly hydrograph figure, cached on the data, display units and zoom window
+    
+    Traces are decimated with LTTB to a screen-sized point budget; inside a
+    zoom window the budget covers only the visible time range, so zooming in
+    far enough shows every sample. Large plots use WebGL traces.
+    """
+    # Plotly is imported on first use so the first page renders sooner
+    import plotly.graph_objects as go
+    
+    result = build_hydrograph_result(shape, peak_flows)
+    
+    # All AEPs are multiples of the same ordinates, so one set of indices serves every trace
+    indices = decimate_window(result.time_hours, result.ordinates, DEFAULT_MAX_POINTS, x_range)
+    time_hours = result.time_hours[indices]
+    scatter = go.Scattergl if use_webgl(len(indices), len(result.labels)) else go.Scatter
+    
+    # Determine which units to display based on sidebar selection
+    if display_units == "CFS":
+        flow = result.flow_cfs
+        y_axis_title = "Discharge (CFS)"
+    else:  # m³/s
+        flow = result.flow_m3s
+        y_axis_title = "Discharge (m³/s)"
+    
+    # Create Plotly figure
+    fig = go.Figure()
+    
+    # Add trace for each AEP
+    for aep in result.labels:
+        fig.add_trace(scatter(
+            x=time_hours,
+            y=flow(aep)[indices],
+            mode='lines',
+            name=f"{aep} year AEP"
+        ))
+    
+    # Update layout
+    fig.update_layout(
+        title="NRCS Dimensionless Unit Hydrographs",
+        xaxis_title="Time (hours)",
+        yaxis_title=y_axis_title,
+        template="plotly_white",
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="right",
+            x=1
+        )
+    )
+    
+    if x_range is not None:
+        fig.update_xaxes(range=list(x_range))
+    
+    return fig
+
+@st.cache_data(show_spinner=False, max_entries=20)
+def export_hydrographs(shape, peak_flows, export_format):
+    """
+    Export the hydrographs in the selected format and return the file contents
+    
+    The file is written to a temporary directory in chunks by the shared
+    export writers, then read back once for the download button.
+    """
+    result = build_hydrograph_result(shape, peak_flows)
+    extension = EXPORT_FORMATS[export_format][0]
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, f"hydrographs.{extension}")
+        export_result(result, path, export_format)
+        with open(path, "rb") as f:
+            return f.read()
 
 def main():
     # Configure the page with a specific port to avoid permission issues
@@ -43,7 +158,7 @@ def main():
         3. **Enter peak flows**: Input peak flows (in CFS) for the AEPs you want to analyze (leave others blank)
         4. **Generate hydrographs**: Click the button to calculate and display results
         5. **View results**: Explore the plot, data table, and calculated parameters in the tabs below
-        6. **Export data**: Download the hydrograph data as a CSV file
+        6. **Export data**: In the Hydrograph Data tab, choose a format (CSV, zipped CSV per AEP, Parquet, Arrow or NetCDF, where the optional packages are installed) and download the hydrograph data
         """)
     
     # Create sidebar for inputs
@@ -119,6 +234,13 @@ def main():
             help="Choose units for displaying hydrograph results"
         )
         
+        # Optional per-run timing panel
+        show_timings = st.checkbox(
+            "Show timing panel",
+            value=False,
+            help="Time each stage of this run and show the results below the tabs"
+        )
+        
         st.header("Peak Flows for AEPs (CFS)")
         
         # AEP values
@@ -144,193 +266,161 @@ def main():
     # Create three tabs - one for plot, one for data, and one for parameters
     tab1, tab2, tab3 = st.tabs(["Hydrograph Plot", "Hydrograph Data", "Calculated Parameters"])
     
-    # Initialize variables to store results
-    if 'hydrographs_df' not in st.session_state:
-        st.session_state.hydrographs_df = None
+    # Initialize variables to store results; the hydrograph itself is identified
+    # by its cache key (shape, peak flows) rather than stored per session
+    if 'hydrograph_key' not in st.session_state:
+        st.session_state.hydrograph_key = None
     
     if 'parameters' not in st.session_state:
         st.session_state.parameters = None
     
-    # Process when generate button is clicked
-    if generate_button:
-        try:
-            # Initialize the NRCS hydrograph generator
-            generator = NRCSHydrographGenerator()
-            
-            # Update generator parameters
-            generator.area_mi2 = area
-            generator.avg_slope = avg_slope
-            generator.time_interval = time_interval
-            generator.m = m_value
-            generator.method = calc_method
-            
-            # Set method-specific parameters
-            if calc_method == "CN":
-                generator.cn = cn
-            else:  # S method
-                generator.S = s_value
-            
-            # Calculate time parameters
-            valid, message = generator.calculate_time_parameters()
+    # Record stage timings for this run when the timing panel is shown (the recorder
+    # is removed even if a stage raises)
+    with contextlib.ExitStack() as timing_context:
+        run_timing_list = timing_context.enter_context(run_timings()) if show_timings else None
+        
+        # Process when generate button is clicked
+        if generate_button:
+            try:
+                # Calculate time parameters (cached on the watershed inputs)
+                with stage("app.time_parameters"):
+                    time_params = calculate_time_parameters_cached(
+                        area, avg_slope, time_interval, m_value, calc_method,
+                        cn if calc_method == "CN" else None,
+                        s_value if calc_method == "S" else None
+                    )
             
-            if not valid:
-                st.warning(message)
+                if not time_params['valid']:
+                    st.warning(time_params['message'])
             
-            # Dictionary to store processed peak flows
-            valid_peak_flows = {}
+                # Dictionary to store processed peak flows
+                valid_peak_flows = {}
             
-            # Process peak flows input
-            for aep in aep_values:
-                peak_flow_str = peak_flows[aep].strip()
-                if peak_flow_str:  # Only process if there's a value
-                    try:
-                        valid_peak_flows[aep] = float(peak_flow_str)
-                    except ValueError:
-                        st.error(f"Invalid peak flow value for {aep} year AEP. Please enter a number.")
+                # Process peak flows input
+                for aep in aep_values:
+                    peak_flow_str = peak_flows[aep].strip()
+                    if peak_flow_str:  # Only process if there's a value
+                        try:
+                            valid_peak_flows[aep] = float(peak_flow_str)
+                        except ValueError:
+                            st.error(f"Invalid peak flow value for {aep} year AEP. Please enter a number.")
             
-            # If no valid peak flows, show message
-            if not valid_peak_flows:
-                st.error("No valid peak flows provided. Please enter at least one peak flow value.")
-            else:
-                # Dictionary to store hydrograph data
-                time_series = None
-                flow_series = {}
+                # If no valid peak flows, show message
+                if not valid_peak_flows:
+                    st.error("No valid peak flows provided. Please enter at least one peak flow value.")
+                else:
+                    # Store only the cache key in session state; the compact result
+                    # (one ordinate vector plus peaks) is shared through the cache
+                    st.session_state.hydrograph_key = (time_params['shape'], tuple(valid_peak_flows.items()))
                 
-                # Generate hydrographs for each AEP with valid peak flow
-                for aep, peak_flow_cfs in valid_peak_flows.items():
-                    time_hours, flow_m3s, flow_cfs = generator.generate_hydrograph(peak_flow_cfs)
+                    # Calculated parameters
+                    st.session_state.parameters = time_params['parameters']
                     
-                    # Store the time series (should be the same for all hydrographs)
-                    if time_series is None:
-                        time_series = time_hours
-                    
-                    # Store flow series
-                    flow_series[aep] = {
-                        'flow_m3s': flow_m3s,
-                        'flow_cfs': flow_cfs
-                    }
-                
-                # Create DataFrame for hydrograph data
-                df = pd.DataFrame({'Time(hr)': time_series})
-                
-                # Add flow data for each AEP
-                for aep, data in flow_series.items():
-                    df[f"{aep}yr_Flow(CFS)"] = data['flow_cfs']
-                    df[f"{aep}yr_Flow(m3/s)"] = data['flow_m3s']
-                
-                # Store in session state
-                st.session_state.hydrographs_df = df
-                
-                # Calculated parameters
-                st.session_state.parameters = generator.get_time_parameters()
-                
-                # Display the plot in tab1
-                with tab1:
-                    # Determine which units to display based on sidebar selection
-                    if display_units == "CFS":
-                        y_column_suffix = "Flow(CFS)"
-                        y_axis_title = "Discharge (CFS)"
-                    else:  # m³/s
-                        y_column_suffix = "Flow(m3/s)"
-                        y_axis_title = "Discharge (m³/s)"
-                    
-                    # Create Plotly figure
-                    fig = go.Figure()
-                    
-                    # Add trace for each AEP
-                    for aep in valid_peak_flows.keys():
-                        fig.add_trace(go.Scatter(
-                            x=df['Time(hr)'],
-                            y=df[f"{aep}yr_{y_column_suffix}"],
-                            mode='lines',
-                            name=f"{aep} year AEP"
-                        ))
-                    
-                    # Update layout
-                    fig.update_layout(
-                        title="NRCS Dimensionless Unit Hydrographs",
-                        xaxis_title="Time (hours)",
-                        yaxis_title=y_axis_title,
-                        template="plotly_white",
-                        legend=dict(
-                            orientation="h",
-                            yanchor="bottom",
-                            y=1.02,
-                            xanchor="right",
-                            x=1
-                        )
-                    )
-                    
-                    # Display figure
-                    st.plotly_chart(fig, use_container_width=True)
-                    
-        except Exception as e:
-            st.error(f"An error occurred: {str(e)}")
-            import traceback
-            st.error(traceback.format_exc())
+            except Exception as e:
+                st.error(f"An error occurred: {str(e)}")
+                import traceback
+                st.error(traceback.format_exc())
     
-    # Display hydrograph data if available
-    if st.session_state.hydrographs_df is not None:
-        # Display the data in tab2
-        with tab2:
-            # Option to show only specific columns
-            units = st.radio("Select units to display:", ["CFS", "m³/s", "Both"], horizontal=True)
+        # Display the plot in tab1 (served from the figure cache on reruns)
+        if st.session_state.hydrograph_key is not None:
+            with tab1:
+                # Zoom window: the selected range is re-decimated at full point budget
+                with stage("app.hydrograph_result"):
+                    end_time = float(build_hydrograph_result(*st.session_state.hydrograph_key).time_hours[-1])
+                x_range = st.slider(
+                    "Time window (hours)",
+                    min_value=0.0,
+                    max_value=end_time,
+                    value=(0.0, end_time),
+                    help="Narrow the window to see the hydrograph at full resolution"
+                )
+                if x_range == (0.0, end_time):
+                    x_range = None
             
-            # Filter columns based on selection
-            df_display = st.session_state.hydrographs_df.copy()
+                with stage("app.figure"):
+                    fig = build_hydrograph_figure(*st.session_state.hydrograph_key, display_units, x_range)
+                with stage("app.render_plot"):
+                    st.plotly_chart(fig, use_container_width=True)
+    
+        # Display hydrograph data if available
+        if st.session_state.hydrograph_key is not None:
+            # Display the data in tab2
+            with tab2:
+                # Option to show only specific columns
+                units = st.radio("Select units to display:", ["CFS", "m³/s", "Both"], horizontal=True)
             
-            if units == "CFS":
-                # Keep only Time and CFS columns
-                cols_to_keep = ['Time(hr)'] + [col for col in df_display.columns if 'CFS' in col]
-                df_display = df_display[cols_to_keep]
-            elif units == "m³/s":
-                # Keep only Time and m3/s columns
-                cols_to_keep = ['Time(hr)'] + [col for col in df_display.columns if 'm3/s' in col]
-                df_display = df_display[cols_to_keep]
+                # Filter columns based on selection (cached view, no per-rerun copy)
+                with stage("app.table_view"):
+                    df_display = build_table_view(*st.session_state.hydrograph_key, units)
             
-            # Display the data
-            st.dataframe(df_display, use_container_width=True)
+                # Display the data
+                with stage("app.render_table"):
+                    st.dataframe(df_display, use_container_width=True)
             
-            # Generate download link
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"NRCS_Hydrographs_{timestamp}.csv"
-            st.markdown(generate_csv_download_link(st.session_state.hydrographs_df, filename), unsafe_allow_html=True)
-            st.write(f"Click the link above to download the hydrograph data as a CSV file.")
+                # Export in the selected format
+                export_format = st.selectbox(
+                    "Export format:",
+                    available_formats(),
+                    help="Parquet and Arrow are compact columnar formats; NetCDF includes CF time metadata"
+                )
+                extension, mime = EXPORT_FORMATS[export_format]
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                filename = f"NRCS_Hydrographs_{timestamp}.{extension}"
+                with stage("app.export"):
+                    export_data = export_hydrographs(*st.session_state.hydrograph_key, export_format)
+                st.download_button(
+                    f"Download {export_format}",
+                    data=export_data,
+                    file_name=filename,
+                    mime=mime
+                )
         
-        # Display calculated parameters in tab3
-        with tab3:
-            # Display parameters
-            if st.session_state.parameters is not None:
-                params_df = pd.DataFrame(list(st.session_state.parameters.items()), columns=['Parameter', 'Value'])
-                st.table(params_df)
+            # Display calculated parameters in tab3
+            with tab3:
+                # Display parameters
+                if st.session_state.parameters is not None:
+                    import pandas as pd
+                    params_df = pd.DataFrame(list(st.session_state.parameters.items()), columns=['Parameter', 'Value'])
+                    st.table(params_df)
                 
-                # Add explanation
-                st.markdown("""
-                ### Explanation of Parameters:
+                    # Add explanation
+                    st.markdown("""
+                    ### Explanation of Parameters:
                 
-                - **Time Lag (hr)**: Time from the centroid of rainfall excess to the hydrograph peak. Calculated using the equation:
+                    - **Time Lag (hr)**: Time from the centroid of rainfall excess to the hydrograph peak. Calculated using the equation:
                   
-                  t_lag = 1.362 × 10⁻³ × [(1000/CN - 9)⁰·⁷] × [L⁰·⁸/√S₀] (CN method)
+                      t_lag = 1.362 × 10⁻³ × [(1000/CN - 9)⁰·⁷] × [L⁰·⁸/√S₀] (CN method)
                   
-                  t_lag = 1.362 × 10⁻³ × [(S/25.4 + 1)⁰·⁷] × [L⁰·⁸/√S₀] (S method)
+                      t_lag = 1.362 × 10⁻³ × [(S/25.4 + 1)⁰·⁷] × [L⁰·⁸/√S₀] (S method)
                   
-                  where L is the hydraulic length in meters and S₀ is the average catchment slope in percent.
+                      where L is the hydraulic length in meters and S₀ is the average catchment slope in percent.
                 
-                - **Time of Concentration (hr)**: The time required for runoff to travel from the hydraulically most distant point to the outlet of the watershed. Calculated as:
+                    - **Time of Concentration (hr)**: The time required for runoff to travel from the hydraulically most distant point to the outlet of the watershed. Calculated as:
                   
-                  tc = t_lag / 0.6
+                      tc = t_lag / 0.6
                 
-                - **Rainfall Duration (hr)**: Duration of effective rainfall. Calculated as:
+                    - **Rainfall Duration (hr)**: Duration of effective rainfall. Calculated as:
                   
-                  tr = 0.133 × tc
+                      tr = 0.133 × tc
                 
-                - **Time to Peak (hr)**: Time from the beginning of the hydrograph to the peak. Calculated as:
+                    - **Time to Peak (hr)**: Time from the beginning of the hydrograph to the peak. Calculated as:
                   
-                  Tp = 0.5 × tr + t_lag
+                      Tp = 0.5 × tr + t_lag
                 
-                The NRCS dimensionless unit hydrograph is valid when:
-                tr ≤ 0.2 × tc   or   tr ≤ 0.3 × Tp
-                """)
+                    The NRCS dimensionless unit hydrograph is valid when:
+                    tr ≤ 0.2 × tc   or   tr ≤ 0.3 × Tp
+                    """)
+    
+    # Show the timings recorded during this run
+    if run_timing_list is not None:
+        with st.expander("Run timings", expanded=True):
+            if run_timing_list:
+                import pandas as pd
+                timings_df = pd.DataFrame(run_timing_list, columns=['Stage', 'Seconds'])
+                timings_df['Milliseconds'] = timings_df.pop('Seconds') * 1000
+                st.table(timings_df)
+            else:
+                st.write("No stages ran in this rerun.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file